@@ -4,6 +4,8 @@
 
 from importlib import import_module
 
+from .instrumentation import instrument, is_profiling_enabled
+
 
 def register(graph_config):
     """
@@ -21,6 +23,9 @@ def register(graph_config):
         ]
     )
 
+    if is_profiling_enabled():
+        instrument()
+
 
 def _import_modules(modules):
     for module in modules:
@@ -0,0 +1,266 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Benchmark taskgraph generation against the parameters in `taskcluster/test/params`.
+
+Every run generates the requested graphs in a fresh process, so that memoized
+state doesn't leak between runs and peak RSS is measured per run. Run it from
+the `taskcluster` directory::
+
+    python3 -m fenix_taskgraph.benchmark --repeat 5 --save-baseline baseline.json
+    python3 -m fenix_taskgraph.benchmark --baseline baseline.json --tolerance 0.2
+
+The command fails if a time or memory budget is exceeded.
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+PARAMS_DIR = os.path.join(ROOT_DIR, "taskcluster", "test", "params")
+
+# Graphs are generated in this order, each one building on the previous one
+GRAPHS = {
+    "full": "full_task_graph",
+    "target": "target_task_graph",
+    "optimized": "optimized_task_graph",
+}
+
+
+def get_default_params_paths():
+    return sorted(
+        os.path.join(PARAMS_DIR, file_name)
+        for file_name in os.listdir(PARAMS_DIR)
+        if file_name.endswith((".yml", ".yaml", ".json"))
+    )
+
+
+def get_params_name(params_path):
+    return os.path.splitext(os.path.basename(params_path))[0]
+
+
+def generate_graphs(params_path, graphs):
+    """Generate `graphs` and return what it cost. Meant to run in a fresh process."""
+    from taskgraph.generator import TaskGraphGenerator
+    from taskgraph.parameters import parameters_loader
+
+    logging.getLogger().setLevel(logging.WARNING)
+    os.chdir(ROOT_DIR)
+
+    parameters = parameters_loader(params_path, strict=False)
+    generator = TaskGraphGenerator(root_dir=None, parameters=parameters)
+
+    wall_times = {}
+    task_counts = {}
+    start = time.monotonic()
+    for graph in graphs:
+        task_graph = getattr(generator, GRAPHS[graph])
+        # Graphs are generated lazily: each time includes the previous graphs
+        wall_times[graph] = time.monotonic() - start
+        task_counts[graph] = len(task_graph.tasks)
+
+    tasks_per_kind = {}
+    for task in generator.full_task_graph.tasks.values():
+        tasks_per_kind[task.kind] = tasks_per_kind.get(task.kind, 0) + 1
+
+    return {
+        "wall_times": wall_times,
+        "task_counts": task_counts,
+        "tasks_per_kind": tasks_per_kind,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def run_benchmark(params_path, graphs, repeat):
+    runs = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            runs.append(executor.submit(generate_graphs, params_path, graphs).result())
+
+    return summarize_runs(runs)
+
+
+def summarize_runs(runs):
+    graphs = list(runs[0]["wall_times"])
+    return {
+        "runs": len(runs),
+        "wall_times": {
+            graph: {
+                "min": min(run["wall_times"][graph] for run in runs),
+                "median": statistics.median(run["wall_times"][graph] for run in runs),
+                "max": max(run["wall_times"][graph] for run in runs),
+            }
+            for graph in graphs
+        },
+        "peak_rss": max(run["peak_rss"] for run in runs),
+        "task_counts": runs[0]["task_counts"],
+        "tasks_per_kind": runs[0]["tasks_per_kind"],
+    }
+
+
+def check_budgets(results, max_time=None, max_rss=None, baseline=None, tolerance=0.0):
+    """Return the list of exceeded budgets.
+
+    Times are compared using the median of the last generated graph.
+    """
+    failures = []
+    for params_name, result in sorted(results.items()):
+        last_graph = list(result["wall_times"])[-1]
+        wall_time = result["wall_times"][last_graph]["median"]
+        peak_rss = result["peak_rss"]
+
+        if max_time is not None and wall_time > max_time:
+            failures.append(
+                "{}: {} graph took {:.2f}s, budget is {:.2f}s".format(
+                    params_name, last_graph, wall_time, max_time
+                )
+            )
+        if max_rss is not None and peak_rss > max_rss:
+            failures.append(
+                "{}: peak RSS is {:.1f} MiB, budget is {:.1f} MiB".format(
+                    params_name, peak_rss / 2**20, max_rss / 2**20
+                )
+            )
+
+        baseline_result = (baseline or {}).get(params_name)
+        if not baseline_result:
+            continue
+        baseline_time = baseline_result["wall_times"].get(last_graph, {}).get("median")
+        if baseline_time is not None and wall_time > baseline_time * (1 + tolerance):
+            failures.append(
+                "{}: {} graph took {:.2f}s, baseline is {:.2f}s".format(
+                    params_name, last_graph, wall_time, baseline_time
+                )
+            )
+        if peak_rss > baseline_result["peak_rss"] * (1 + tolerance):
+            failures.append(
+                "{}: peak RSS is {:.1f} MiB, baseline is {:.1f} MiB".format(
+                    params_name, peak_rss / 2**20, baseline_result["peak_rss"] / 2**20
+                )
+            )
+    return failures
+
+
+def format_results(results):
+    graphs = list(next(iter(results.values()))["wall_times"]) if results else []
+    lines = [
+        "{:<32} {}  {:>10}  {}".format(
+            "parameters",
+            "  ".join("{:>16}".format("{} (s)".format(graph)) for graph in graphs),
+            "RSS (MiB)",
+            "tasks",
+        )
+    ]
+    for params_name, result in sorted(results.items()):
+        lines.append(
+            "{:<32} {}  {:>10.1f}  {}".format(
+                params_name,
+                "  ".join(
+                    "{:>16}".format(
+                        "{:.2f} ±{:.2f}".format(
+                            result["wall_times"][graph]["median"],
+                            result["wall_times"][graph]["max"]
+                            - result["wall_times"][graph]["min"],
+                        )
+                    )
+                    for graph in graphs
+                ),
+                result["peak_rss"] / 2**20,
+                "/".join(str(result["task_counts"][graph]) for graph in graphs),
+            )
+        )
+    return "\n".join(lines)
+
+
+def format_tasks_per_kind(results):
+    lines = []
+    for params_name, result in sorted(results.items()):
+        lines.append("{}:".format(params_name))
+        for kind, count in sorted(
+            result["tasks_per_kind"].items(), key=lambda item: (-item[1], item[0])
+        ):
+            lines.append("    {:>5}  {}".format(count, kind))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark taskgraph generation for each parameters file."
+    )
+    parser.add_argument(
+        "-p",
+        "--parameters",
+        dest="params_paths",
+        action="append",
+        help="parameters file to benchmark (default: all of taskcluster/test/params)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="number of runs per parameters file"
+    )
+    parser.add_argument(
+        "--graphs",
+        default=",".join(GRAPHS),
+        help="comma-separated graphs to generate, among: {}".format(", ".join(GRAPHS)),
+    )
+    parser.add_argument("--max-time", type=float, help="time budget in seconds")
+    parser.add_argument("--max-rss", type=float, help="peak RSS budget in MiB")
+    parser.add_argument("--baseline", help="baseline file to compare results with")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="allowed relative regression against the baseline (default: 0.1)",
+    )
+    parser.add_argument("--save-baseline", help="file to save results to")
+    parser.add_argument(
+        "--per-kind", action="store_true", help="also print task counts per kind"
+    )
+
+    result = parser.parse_args()
+    graphs = [graph for graph in GRAPHS if graph in result.graphs.split(",")]
+    params_paths = result.params_paths or get_default_params_paths()
+
+    results = {}
+    for params_path in params_paths:
+        print("Benchmarking {}...".format(params_path), file=sys.stderr)
+        results[get_params_name(params_path)] = run_benchmark(
+            os.path.abspath(params_path), graphs, result.repeat
+        )
+
+    print(format_results(results))
+    if result.per_kind:
+        print(format_tasks_per_kind(results))
+
+    if result.save_baseline:
+        with open(result.save_baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    baseline = None
+    if result.baseline:
+        with open(result.baseline) as f:
+            baseline = json.load(f)
+
+    failures = check_budgets(
+        results,
+        max_time=result.max_time,
+        max_rss=result.max_rss * 2**20 if result.max_rss is not None else None,
+        baseline=baseline,
+        tolerance=result.tolerance,
+    )
+    if failures:
+        print("\n".join(["Budget exceeded:"] + failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
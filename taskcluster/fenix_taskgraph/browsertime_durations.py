@@ -0,0 +1,155 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Model of how long each browsertime test takes to run on a device.
+
+The model is built from the browsertime tasks of previous graphs: every
+completed run, i.e. one which uploaded its `public/test_info`, gives a sample
+for the tests it ran. Run it from the `taskcluster` directory, with the ids of
+decision tasks (e.g. of the last nightlies)::
+
+    python3 -m fenix_taskgraph.browsertime_durations <decision task id>...
+
+Then set `duration-model: durations.json` in the browsertime kind, so that its
+tasks get a `max-run-time` based on how long their test took.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from taskgraph.util.memoize import memoize
+from taskgraph.util.taskcluster import get_artifact, parse_time, status_task
+
+
+logger = logging.getLogger(__name__)
+
+BROWSERTIME_KIND_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "ci", "browsertime")
+)
+DEFAULT_MODEL_PATH = os.path.join(BROWSERTIME_KIND_DIR, "durations.json")
+
+# Margin between the longest expected duration of a task and its max-run-time
+MAX_RUN_TIME_MARGIN = 1.5
+MIN_MAX_RUN_TIME = 600
+
+
+@memoize
+def load_duration_model(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_test_durations(model, test_names, statistic):
+    """Return the `statistic` duration of each test, or None if one is unknown"""
+    tests = model["tests"]
+    if any(test_name not in tests for test_name in test_names):
+        return None
+    return [tests[test_name][statistic] for test_name in test_names]
+
+
+def get_max_run_time(model, test_names, default):
+    """Return a max-run-time fit for running `test_names` in a single task.
+
+    It's never higher than `default`, which is used as is when a test has no
+    duration recorded in the model.
+    """
+    durations = get_test_durations(model, test_names, "p90")
+    if durations is None:
+        return default
+
+    max_run_time = max(sum(durations) * MAX_RUN_TIME_MARGIN, MIN_MAX_RUN_TIME)
+    # Round up to the minute
+    return min(int(math.ceil(max_run_time / 60)) * 60, default)
+
+
+def _get_test_name(task_definition):
+    for part in task_definition["payload"].get("command", []):
+        # Commands are either lists of arguments or a shell command
+        for argument in part if isinstance(part, list) else [part]:
+            if isinstance(argument, str) and argument.startswith("--test="):
+                return argument[len("--test=") :]
+    return None
+
+
+def _get_run_durations(task_id):
+    status = status_task(task_id)
+    return [
+        (parse_time(run["resolved"]) - parse_time(run["started"])).total_seconds()
+        for run in status.get("runs", [])
+        if run.get("state") == "completed"
+    ]
+
+
+def collect_samples(decision_task_ids, jobs=None):
+    """Return the duration samples of each test run by the given graphs"""
+    browsertime_tasks = {}
+    for decision_task_id in decision_task_ids:
+        task_graph = get_artifact(decision_task_id, "public/task-graph.json")
+        for task_id, task in task_graph.items():
+            if task["attributes"].get("kind") != "browsertime":
+                continue
+            test_name = _get_test_name(task["task"])
+            if test_name is None:
+                logger.warning("No --test argument in {}".format(task["label"]))
+                continue
+            browsertime_tasks[task_id] = test_name
+
+    samples = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        run_durations = executor.map(_get_run_durations, browsertime_tasks)
+        for test_name, durations in zip(browsertime_tasks.values(), run_durations):
+            samples.setdefault(test_name, []).extend(durations)
+    return samples
+
+
+def build_duration_model(samples):
+    tests = {}
+    for test_name, durations in sorted(samples.items()):
+        durations = sorted(durations)
+        tests[test_name] = {
+            "median": round(statistics.median(durations)),
+            "p90": round(durations[int(math.ceil(0.9 * len(durations))) - 1]),
+            "samples": len(durations),
+        }
+    return {"tests": tests}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the duration model of browsertime tests from past graphs."
+    )
+    parser.add_argument(
+        "decision_task_ids",
+        nargs="+",
+        metavar="decision-task-id",
+        help="decision task of a graph which ran browsertime tasks",
+    )
+    parser.add_argument(
+        "--output",
+        default=DEFAULT_MODEL_PATH,
+        help="file to write the model to (default: ci/browsertime/durations.json)",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, help="number of concurrent requests to taskcluster"
+    )
+
+    result = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    model = build_duration_model(collect_samples(result.decision_task_ids, result.jobs))
+    with open(result.output, "w") as f:
+        json.dump(model, f, indent=2, sort_keys=True)
+        f.write("\n")
+    logger.info(
+        "Wrote durations of {} tests to {}".format(len(model["tests"]), result.output)
+    )
+
+
+if __name__ == "__main__":
+    main()
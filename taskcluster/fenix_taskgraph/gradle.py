@@ -2,57 +2,284 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import hashlib
 import json
+import logging
+import os
 import subprocess
+from collections import namedtuple
 
+from taskgraph.util.hash import hash_path
 from taskgraph.util.memoize import memoize
 
+from fenix_taskgraph.static_variants import (
+    UnsupportedGradleConfiguration,
+    diff_variants,
+    resolve_variants,
+)
+from fenix_taskgraph.util.cache import DiskCache
+
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# Files whose content may change the output of `./gradlew printVariants`. Paths
+# are relative to the root of the repository. Directories are hashed recursively.
+GRADLE_INPUTS = (
+    "build.gradle",
+    "settings.gradle",
+    "gradle.properties",
+    "local.properties",
+    "gradle/wrapper/gradle-wrapper.properties",
+    "buildSrc",
+)
+# Directories found under `buildSrc` that only contain build outputs
+IGNORED_GRADLE_INPUT_DIRS = (".gradle", "build")
+
+variants_cache = DiskCache("variants")
+
+# How variants are discovered. Set `FENIX_TASKGRAPH_VARIANTS` to override:
+#  * "gradle" (default): always ask Gradle.
+#  * "verify": ask Gradle, and also read the build scripts to warn about any
+#    difference with what Gradle reports. Gradle's variants are used.
+#  * "static": read the build scripts without booting Gradle, falling back to
+#    Gradle if they contain something the static resolver doesn't understand.
+# The static resolver hasn't been compared with Gradle in CI yet, which is what
+# "verify" is for.
+VARIANTS_SOURCES = ("gradle", "verify", "static")
+
+
+# A piece of information Gradle prints on a single line starting with `prefix`,
+# once `task` is run. `parse` turns the rest of the line into a Python value.
+GradleQuery = namedtuple("GradleQuery", ("task", "prefix", "parse"))
+
+GRADLE_QUERIES = {
+    "variants": GradleQuery("printVariants", "variants: ", json.loads),
+    "test-build-type": GradleQuery("printTestBuildType", "testBuildType: ", json.loads),
+    "dependency-versions": GradleQuery(
+        "printDependencyVersions", "dependencyVersions: ", json.loads
+    ),
+}
+
+
+class VariantRegistry:
+    """Variants indexed by build type.
+
+    Gradle task names are computed once per variant and rendered APK artifacts
+    once per artifact template, so transforms only do lookups.
+    """
+
+    def __init__(self, variants):
+        self._variants_per_build_type = {}
+        for variant in variants:
+            self._variants_per_build_type.setdefault(variant["build_type"], []).append(
+                variant
+            )
+        self._capitalized_names = {
+            variant["name"]: variant["name"].capitalize() for variant in variants
+        }
+        self._rendered_apks = {}
+
+    def get_variant(self, build_type):
+        matching_variants = self._variants_per_build_type.get(build_type, [])
+        number_of_matching_variants = len(matching_variants)
+        if number_of_matching_variants == 0:
+            raise ValueError('No variant found for build type "{}"'.format(build_type))
+        elif number_of_matching_variants > 1:
+            raise ValueError(
+                'Too many variants found for build type "{}"": {}'.format(
+                    build_type, matching_variants
+                )
+            )
+
+        return matching_variants[0]
+
+    def get_gradle_task(self, action, build_type):
+        """Return the Gradle task running `action` on the variant, e.g. `assembleNightly`"""
+        variant_name = self.get_variant(build_type)["name"]
+        return "{}{}".format(action, self._capitalized_names[variant_name])
+
+    def get_apk_artifacts(self, build_type, artifact_template, version):
+        """Render `artifact_template` for every APK of the variant.
+
+        Returns a tuple made of the list of task artifacts and the `apks`
+        attribute, keyed by ABI.
+        """
+        key = (build_type, tuple(sorted(artifact_template.items())), version)
+        if key not in self._rendered_apks:
+            artifacts = []
+            apks = {}
+            for apk in self.get_variant(build_type)["apks"]:
+                apk_name = artifact_template["name"].format(**apk)
+                artifacts.append(
+                    {
+                        "type": artifact_template["type"],
+                        "name": apk_name,
+                        "path": artifact_template["path"].format(
+                            gradle_build_type=build_type, **apk
+                        ),
+                    }
+                )
+                apks[apk["abi"]] = {
+                    "name": apk_name,
+                    "github-name": artifact_template["github-name"].format(
+                        version=version, **apk
+                    ),
+                }
+            self._rendered_apks[key] = (artifacts, apks)
+
+        artifacts, apks = self._rendered_apks[key]
+        # Tasks are mutated by later transforms, hand out copies
+        return (
+            [dict(artifact) for artifact in artifacts],
+            {abi: dict(apk) for abi, apk in apks.items()},
+        )
+
+
+@memoize
+def get_variant_registry():
+    return VariantRegistry(_fetch_all_variants())
+
 
 def get_variant(build_type):
-    all_variants = _fetch_all_variants()
-    matching_variants = [
-        variant for variant in all_variants if variant["build_type"] == build_type
-    ]
-    number_of_matching_variants = len(matching_variants)
-    if number_of_matching_variants == 0:
-        raise ValueError('No variant found for build type "{}"'.format(build_type))
-    elif number_of_matching_variants > 1:
+    return get_variant_registry().get_variant(build_type)
+
+
+@memoize
+def _fetch_all_variants():
+    source = os.environ.get("FENIX_TASKGRAPH_VARIANTS", "gradle")
+    if source not in VARIANTS_SOURCES:
         raise ValueError(
-            'Too many variants found for build type "{}"": {}'.format(
-                build_type, matching_variants
+            'Unknown variants source "{}". Expected one of: {}'.format(
+                source, ", ".join(VARIANTS_SOURCES)
             )
         )
 
-    return matching_variants.pop()
+    if source == "gradle":
+        return _fetch_all_variants_from_gradle()
+
+    if source == "verify":
+        variants = _fetch_all_variants_from_gradle()
+        _verify_static_variants(variants)
+        return variants
+
+    try:
+        return resolve_variants(ROOT_DIR)
+    except UnsupportedGradleConfiguration as e:
+        logger.warning(
+            "Cannot resolve variants statically ({}). Falling back to Gradle.".format(e)
+        )
+        return _fetch_all_variants_from_gradle()
+
+
+def _verify_static_variants(gradle_variants):
+    """Warn about differences between Gradle's variants and the static ones"""
+    try:
+        variants = resolve_variants(ROOT_DIR)
+    except UnsupportedGradleConfiguration as e:
+        logger.warning("Cannot resolve variants statically ({})".format(e))
+        return
+
+    differences = diff_variants(gradle_variants, variants)
+    if differences:
+        logger.warning(
+            "Statically resolved variants differ from Gradle's:\n{}".format(
+                "\n".join(differences)
+            )
+        )
+    else:
+        logger.info("Statically resolved variants match Gradle's")
+
+
+def _fetch_all_variants_from_gradle():
+    digest = hash_gradle_inputs()
+    variants = variants_cache.get(digest)
+    if variants is None:
+        variants = run_gradle_queries("variants")["variants"]
+        variants_cache.put(digest, variants)
+
+    return variants
+
+
+def _find_gradle_inputs():
+    paths = list(GRADLE_INPUTS)
+    # Each subproject (e.g. "app") has its own build scripts
+    for entry in sorted(os.listdir(ROOT_DIR)):
+        if entry != "buildSrc" and os.path.isdir(os.path.join(ROOT_DIR, entry)):
+            paths.extend(
+                os.path.join(entry, file_name)
+                for file_name in sorted(os.listdir(os.path.join(ROOT_DIR, entry)))
+                if file_name.endswith((".gradle", ".gradle.kts"))
+            )
+
+    for path in paths:
+        full_path = os.path.join(ROOT_DIR, path)
+        if os.path.isfile(full_path):
+            yield path
+        elif os.path.isdir(full_path):
+            for dir_path, dir_names, file_names in os.walk(full_path):
+                dir_names[:] = sorted(
+                    d for d in dir_names if d not in IGNORED_GRADLE_INPUT_DIRS
+                )
+                for file_name in sorted(file_names):
+                    yield os.path.relpath(os.path.join(dir_path, file_name), ROOT_DIR)
 
 
 @memoize
-def _fetch_all_variants():
-    output = _run_gradle_process("printVariants")
-    content = _extract_content_from_command_output(output, prefix="variants: ")
-    return json.loads(content)
+def hash_gradle_inputs():
+    """Digest of every file that may influence the variants Gradle reports"""
+    h = hashlib.sha256()
+    for path in _find_gradle_inputs():
+        h.update(
+            "{} {}\n".format(hash_path(os.path.join(ROOT_DIR, path)), path).encode(
+                "utf-8"
+            )
+        )
+    return h.hexdigest()
+
+
+def run_gradle_queries(*query_names, **kwargs):
+    """Answer several queries of `GRADLE_QUERIES` with a single Gradle invocation.
+
+    Keyword arguments are passed to Gradle as project properties. Returns a dict
+    of parsed results, keyed by query name.
+    """
+    queries = {name: GRADLE_QUERIES[name] for name in query_names}
+    gradle_tasks = sorted({query.task for query in queries.values()})
 
+    results = {}
+    for line in _run_gradle_process(gradle_tasks, **kwargs):
+        for name, query in queries.items():
+            if name not in results and line.startswith(query.prefix):
+                results[name] = query.parse(line[len(query.prefix) :])
 
-def _run_gradle_process(gradle_command, **kwargs):
+    missing_queries = sorted(set(queries) - set(results))
+    if missing_queries:
+        raise RuntimeError(
+            "Gradle did not answer these queries: {}".format(", ".join(missing_queries))
+        )
+
+    return results
+
+
+def _run_gradle_process(gradle_tasks, **kwargs):
+    """Run Gradle and yield each line it outputs, as soon as it's printed"""
     gradle_properties = [
         "-P{property_name}={value}".format(property_name=property_name, value=value)
         for property_name, value in kwargs.items()
     ]
 
     process = subprocess.Popen(
-        ["./gradlew", "--no-daemon", "--quiet", gradle_command] + gradle_properties,
+        ["./gradlew", "--no-daemon", "--quiet"] + gradle_tasks + gradle_properties,
+        cwd=ROOT_DIR,
         stdout=subprocess.PIPE,
         universal_newlines=True,
     )
-    output, err = process.communicate()
+    with process.stdout:
+        for line in process.stdout:
+            yield line.rstrip("\n")
     exit_code = process.wait()
 
     if exit_code != 0:
         raise RuntimeError("Gradle command returned error: {}".format(exit_code))
-
-    return output
-
-
-def _extract_content_from_command_output(output, prefix):
-    variants_line = [line for line in output.split("\n") if line.startswith(prefix)][0]
-    return variants_line.split(" ", 1)[1]
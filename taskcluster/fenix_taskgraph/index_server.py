@@ -0,0 +1,150 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Local stand-in of the Taskcluster index, to test and benchmark index lookups
+offline.
+
+It serves the `findTask` and `findTasksAtIndex` endpoints from a JSON file
+mapping index paths to task ids. Latency and transient failures can be added
+to every request. Run it from the `taskcluster` directory, then point
+`TASKCLUSTER_ROOT_URL` at it, e.g. to check the nightly isn't scheduled twice::
+
+    python3 -m fenix_taskgraph.index_server indexes.json --port 8000
+    MOZ_AUTOMATION=1 TASKCLUSTER_ROOT_URL=http://localhost:8000 \\
+        taskgraph target -p test/params/main-repo-cron-nightly.yml
+
+The number of requests it got is printed when it's stopped.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+INDEX_PREFIX = "/api/index/v1/"
+# Most tasks `findTasksAtIndex` returns per page
+PAGE_SIZE = 1000
+
+
+class IndexServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, indexes, latency=0.0, failure_rate=0.0):
+        super().__init__(address, IndexRequestHandler)
+        self.indexes = indexes
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.request_counts = {}
+        self._lock = threading.Lock()
+
+    def count_request(self, endpoint):
+        with self._lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+
+class IndexRequestHandler(BaseHTTPRequestHandler):
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start(self, endpoint):
+        """Count the request and simulate the network. Returns False if it failed."""
+        self.server.count_request(endpoint)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if random.random() < self.server.failure_rate:
+            self._send_json(503, {"message": "Simulated failure"})
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.startswith(INDEX_PREFIX + "task/"):
+            self._send_json(404, {"message": "Unknown endpoint"})
+            return
+        if not self._start("findTask"):
+            return
+
+        index_path = url.path[len(INDEX_PREFIX + "task/") :]
+        task_id = self.server.indexes.get(index_path)
+        if task_id is None:
+            self._send_json(404, {"message": "Indexed task not found"})
+        else:
+            self._send_json(200, {"namespace": index_path, "taskId": task_id})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        # Consume the body even if the request fails, so the connection is reusable
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if url.path != INDEX_PREFIX + "tasks/indexes":
+            self._send_json(404, {"message": "Unknown endpoint"})
+            return
+        if not self._start("findTasksAtIndex"):
+            return
+
+        found = [
+            {"namespace": index_path, "taskId": self.server.indexes[index_path]}
+            for index_path in json.loads(body)["indexes"]
+            if index_path in self.server.indexes
+        ]
+        start = int(parse_qs(url.query).get("continuationToken", ["0"])[0])
+        data = {"tasks": found[start : start + PAGE_SIZE]}
+        if start + PAGE_SIZE < len(found):
+            data["continuationToken"] = str(start + PAGE_SIZE)
+        self._send_json(200, data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a local stand-in of the Taskcluster index."
+    )
+    parser.add_argument(
+        "indexes", help="JSON file mapping index paths to the ids of their tasks"
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds to wait before answering"
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.0,
+        help="share of requests answered with a 503, to exercise retries",
+    )
+    result = parser.parse_args()
+
+    with open(result.indexes) as f:
+        indexes = json.load(f)
+    server = IndexServer(
+        (result.host, result.port), indexes, result.latency, result.failure_rate
+    )
+    print(
+        "Serving {} index paths on http://{}:{}".format(
+            len(indexes), result.host, server.server_port
+        )
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for endpoint, count in sorted(server.request_counts.items()):
+            print("{}: {} requests".format(endpoint, count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Opt-in profiling of the fenix transforms and loaders.
+
+Set `FENIX_TASKGRAPH_PROFILE=1` to record, for every transform and loader run
+by every kind, its wall time, the number of tasks it received and produced, and
+its peak memory allocation. Results are written when the process exits to
+`transforms-profile.json` and `transforms-profile.txt`, in the directory given
+by `FENIX_TASKGRAPH_PROFILE_DIR` (defaults to the decision task's `artifacts`).
+
+Each instrumented step consumes all of its input before running, so that its
+measurements don't include the work of the previous steps. This makes graph
+generation slower and less lazy than usual: only enable it when profiling.
+"""
+
+import atexit
+import functools
+import importlib
+import json
+import logging
+import os
+import pkgutil
+import time
+import tracemalloc
+
+from taskgraph.transforms.base import TransformSequence
+
+
+logger = logging.getLogger(__name__)
+
+INSTRUMENTED_PACKAGES = ("fenix_taskgraph.transforms", "fenix_taskgraph.loader")
+
+
+def is_profiling_enabled():
+    return os.environ.get("FENIX_TASKGRAPH_PROFILE", "") not in ("", "0")
+
+
+class Profiler:
+    def __init__(self):
+        self.records = {}
+
+    def _start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        # tracemalloc.reset_peak() only exists on Python 3.9+. Without it, the
+        # peak is the highest since tracing started.
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        return time.monotonic(), tracemalloc.get_traced_memory()[0]
+
+    def _stop(self, kind, step, start, tasks_in, tasks_out):
+        start_time, start_memory = start
+        wall_time = time.monotonic() - start_time
+        peak_memory = max(tracemalloc.get_traced_memory()[1] - start_memory, 0)
+
+        record = self.records.setdefault(
+            (kind, step),
+            {
+                "kind": kind,
+                "step": step,
+                "calls": 0,
+                "wall_time": 0.0,
+                "tasks_in": 0,
+                "tasks_out": 0,
+                "peak_memory": 0,
+            },
+        )
+        record["calls"] += 1
+        record["wall_time"] += wall_time
+        record["tasks_in"] += tasks_in
+        record["tasks_out"] += tasks_out
+        record["peak_memory"] = max(record["peak_memory"], peak_memory)
+
+    def wrap_transform(self, func):
+        step = _get_step_name(func)
+
+        @functools.wraps(func)
+        def wrapper(config, tasks):
+            tasks = list(tasks)
+            start = self._start()
+            transformed_tasks = list(func(config, tasks))
+            self._stop(config.kind, step, start, len(tasks), len(transformed_tasks))
+            yield from transformed_tasks
+
+        wrapper.instrumented = True
+        return wrapper
+
+    def wrap_loader(self, func):
+        step = "loader:{}".format(_get_step_name(func))
+
+        @functools.wraps(func)
+        def wrapper(kind, path, config, params, loaded_tasks):
+            start = self._start()
+            tasks = list(func(kind, path, config, params, loaded_tasks))
+            self._stop(kind, step, start, len(loaded_tasks), len(tasks))
+            return tasks
+
+        wrapper.instrumented = True
+        return wrapper
+
+    def get_report(self):
+        steps = sorted(
+            self.records.values(), key=lambda record: record["wall_time"], reverse=True
+        )
+        kinds = {}
+        for record in steps:
+            kind = kinds.setdefault(
+                record["kind"], {"wall_time": 0.0, "peak_memory": 0, "steps": 0}
+            )
+            kind["wall_time"] += record["wall_time"]
+            kind["peak_memory"] = max(kind["peak_memory"], record["peak_memory"])
+            kind["steps"] += 1
+        return {"steps": steps, "kinds": kinds}
+
+    def format_summary(self, report):
+        lines = [
+            "{:>10} {:>12} {:>8} {:>8}  {}".format(
+                "time (s)", "peak (KiB)", "in", "out", "kind / step"
+            )
+        ]
+        for record in report["steps"]:
+            lines.append(
+                "{:>10.3f} {:>12.1f} {:>8} {:>8}  {} / {}".format(
+                    record["wall_time"],
+                    record["peak_memory"] / 1024,
+                    record["tasks_in"],
+                    record["tasks_out"],
+                    record["kind"],
+                    record["step"],
+                )
+            )
+
+        lines.extend(["", "{:>10} {:>12}  {}".format("time (s)", "peak (KiB)", "kind")])
+        for kind_name, kind in sorted(
+            report["kinds"].items(), key=lambda item: item[1]["wall_time"], reverse=True
+        ):
+            lines.append(
+                "{:>10.3f} {:>12.1f}  {}".format(
+                    kind["wall_time"], kind["peak_memory"] / 1024, kind_name
+                )
+            )
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, output_dir):
+        if not self.records:
+            return
+
+        report = self.get_report()
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, "transforms-profile.json"), "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        with open(os.path.join(output_dir, "transforms-profile.txt"), "w") as f:
+            f.write(self.format_summary(report))
+        logger.info("Wrote transforms profile to {}".format(output_dir))
+
+
+profiler = Profiler()
+
+
+def _get_step_name(func):
+    return "{}.{}".format(
+        func.__module__, getattr(func, "__name__", type(func).__name__)
+    )
+
+
+def _iter_modules(package_name):
+    package = importlib.import_module(package_name)
+    yield package
+    for module_info in pkgutil.iter_modules(package.__path__):
+        yield importlib.import_module("{}.{}".format(package_name, module_info.name))
+
+
+def instrument():
+    """Wrap every fenix transform and loader with the profiler"""
+    for package_name in INSTRUMENTED_PACKAGES:
+        for module in _iter_modules(package_name):
+            transforms = getattr(module, "transforms", None)
+            if isinstance(transforms, TransformSequence):
+                transforms._transforms[:] = [
+                    xform
+                    if getattr(xform, "instrumented", False)
+                    else profiler.wrap_transform(xform)
+                    for xform in transforms._transforms
+                ]
+
+            loader = getattr(module, "loader", None)
+            if callable(loader) and not getattr(loader, "instrumented", False):
+                module.loader = profiler.wrap_loader(loader)
+
+    if not getattr(instrument, "registered_report", False):
+        output_dir = os.environ.get("FENIX_TASKGRAPH_PROFILE_DIR", "artifacts")
+        atexit.register(profiler.write_report, output_dir)
+        instrument.registered_report = True
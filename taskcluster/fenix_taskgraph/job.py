@@ -2,8 +2,12 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import json
+
+import taskgraph
 from taskgraph.transforms.job import run_job_using, configure_taskdesc_for_run
 from taskgraph.util import path
+from taskgraph.util.hash import hash_paths
 from taskgraph.util.schema import Schema, taskref_or_string
 from voluptuous import Required, Optional
 
@@ -31,11 +35,25 @@ gradlew_schema = Schema(
         # Base work directory used to set up the task.
         Required("workdir"): str,
         Optional("use-caches"): bool,
+        # Whether to mount a Gradle home and a build cache which persist across
+        # tasks using the same Gradle dependencies. They're only mounted in
+        # trusted environments, and not in cached tasks (see `resources`).
+        Optional("gradle-cache"): bool,
+        # Files the output of the task depends on. When given, the task is
+        # cached: it's replaced by the last task with the same files, command,
+        # docker image and dependencies.
+        Optional("resources"): [str],
         Optional("secrets"): [secret_schema],
         Optional("dummy-secrets"): [dummy_secret_schema],
     }
 )
 
+GRADLE_DEPENDENCIES_TOOLCHAIN = "android-gradle-dependencies"
+GRADLE_HOME = "/builds/worker/gradle-home"
+GRADLE_BUILD_CACHE_DIR = "/builds/worker/gradle-build-cache"
+GRADLE_CACHE_STATS = "/builds/worker/artifacts/gradle-cache-stats.json"
+GRADLEW_CACHE_TYPE = "gradlew.v1"
+
 run_commands_schema = Schema(
     {
         Required("using"): "run-commands",
@@ -53,13 +71,7 @@ run_commands_schema = Schema(
 def configure_run_commands_schema(config, job, taskdesc):
     run = job["run"]
     pre_commands = run.pop("pre-commands", [])
-    pre_commands += [
-        _generate_dummy_secret_command(secret)
-        for secret in run.pop("dummy-secrets", [])
-    ]
-    pre_commands += [
-        _generate_secret_command(secret) for secret in run.get("secrets", [])
-    ]
+    pre_commands += _generate_secrets_commands(run)
 
     all_commands = pre_commands + run.pop("commands", [])
 
@@ -79,21 +91,123 @@ def configure_gradlew(config, job, taskdesc):
         {"ANDROID_SDK_ROOT": path.join(fetches_dir, "android-sdk-linux")}
     )
 
+    resources = run.pop("resources", None)
+    gradle_cache = run.pop("gradle-cache", False)
+    if resources is not None and gradle_cache:
+        # The outputs of cached tasks must only depend on their digest, not on
+        # the state of a persistent cache
+        raise Exception(
+            "Task {} can't be both cached and use Gradle caches".format(
+                taskdesc["label"]
+            )
+        )
+    if resources is not None and not taskgraph.fast:
+        taskdesc["cache"] = {
+            "type": GRADLEW_CACHE_TYPE,
+            "name": taskdesc["label"].replace("{}-".format(config.kind), "", 1),
+            "digest-data": _get_gradlew_digest_data(config, run, worker, resources),
+        }
+
+    # Caches are keyed by the digest of the Gradle dependencies, which isn't
+    # computed in fast mode
+    if gradle_cache and not taskgraph.fast and _are_caches_trusted(config):
+        _add_gradle_caches(config, run, worker)
+
     run["command"] = _extract_gradlew_command(run, fetches_dir)
     _inject_secrets_scopes(run, taskdesc)
     _set_run_task_attributes(job)
     configure_taskdesc_for_run(config, job, taskdesc, job["worker"]["implementation"])
 
 
+def _get_gradlew_digest_data(config, run, worker, resources):
+    # Gradle caches only make the build faster: the digest is computed before
+    # they're set up, so that tasks of all levels share it.
+    command = {
+        key: run.get(key)
+        for key in (
+            "pre-gradlew",
+            "gradlew",
+            "post-gradlew",
+            "secrets",
+            "dummy-secrets",
+        )
+    }
+    data = [
+        hash_paths(config.graph_config.vcs_root, resources),
+        json.dumps(command, sort_keys=True),
+        json.dumps(worker.get("env", {}), sort_keys=True),
+    ]
+    # Like toolchains, the name of the image stands for its content
+    image = worker.get("docker-image", {}).get("in-tree")
+    if image:
+        data.append(image)
+    return data
+
+
+def _are_caches_trusted(config):
+    # Caches are shared by all the tasks of a level. Level 1 ones, e.g. of pull
+    # requests, could have been tampered with (see `skip-untrusted` in
+    # `taskgraph.transforms.task`).
+    return not config.params.is_try() and int(config.params["level"]) > 1
+
+
+def _get_gradle_dependencies_digest(config):
+    for task in config.kind_dependencies_tasks.values():
+        if task.attributes.get("toolchain-alias") == GRADLE_DEPENDENCIES_TOOLCHAIN:
+            return task.attributes["cached_task"]["digest"]
+    raise Exception(
+        'Kind "{}" must depend on the "{}" toolchain to use Gradle caches'.format(
+            config.kind, GRADLE_DEPENDENCIES_TOOLCHAIN
+        )
+    )
+
+
+def _add_gradle_caches(config, run, worker):
+    """Mount Gradle caches, keyed by the Gradle dependencies they were built with.
+
+    Builds restore up-to-date outputs from the build cache instead of compiling
+    everything again, `clean` included. Stats about cache hits are printed and
+    uploaded by `taskcluster/scripts/gradle-cache.gradle`.
+    """
+    digest = _get_gradle_dependencies_digest(config)[:16]
+    for name, mount_point in (
+        ("gradle-home", GRADLE_HOME),
+        ("gradle-build-cache", GRADLE_BUILD_CACHE_DIR),
+    ):
+        worker.setdefault("caches", []).append(
+            {
+                "type": "persistent",
+                "name": "{}-{}".format(name, digest),
+                "mount-point": mount_point,
+                "skip-untrusted": True,
+            }
+        )
+        # Declared here rather than in the image, which other tasks share
+        worker.setdefault("volumes", []).append(mount_point)
+
+    worker["env"].update(
+        {
+            "GRADLE_USER_HOME": GRADLE_HOME,
+            "GRADLE_BUILD_CACHE_DIR": GRADLE_BUILD_CACHE_DIR,
+            "GRADLE_CACHE_STATS": GRADLE_CACHE_STATS,
+        }
+    )
+    worker.setdefault("artifacts", []).append(
+        {
+            "type": "file",
+            "name": "public/gradle-cache-stats.json",
+            "path": GRADLE_CACHE_STATS,
+        }
+    )
+    run["gradlew"] = [
+        "--build-cache",
+        "--init-script=taskcluster/scripts/gradle-cache.gradle",
+    ] + run["gradlew"]
+
+
 def _extract_gradlew_command(run, fetches_dir):
     pre_gradle_commands = run.pop("pre-gradlew", [])
-    pre_gradle_commands += [
-        _generate_dummy_secret_command(secret)
-        for secret in run.pop("dummy-secrets", [])
-    ]
-    pre_gradle_commands += [
-        _generate_secret_command(secret) for secret in run.get("secrets", [])
-    ]
+    pre_gradle_commands += _generate_secrets_commands(run)
 
     maven_dependencies_dir = path.join(fetches_dir, "android-gradle-dependencies")
     gradle_repos_args = [
@@ -111,34 +225,22 @@ def _extract_gradlew_command(run, fetches_dir):
     return _convert_commands_to_string(commands)
 
 
-def _generate_secret_command(secret):
-    secret_command = [
-        "taskcluster/scripts/get-secret.py",
-        "-s",
-        secret["name"],
-        "-k",
-        secret["key"],
-        "-f",
-        secret["path"],
-    ]
-    if secret.get("json"):
-        secret_command.append("--json")
-
-    return secret_command
-
+def _generate_secrets_commands(run):
+    """Return the command writing all the secrets of `run`, if it has any.
 
-def _generate_dummy_secret_command(secret):
-    secret_command = [
-        "taskcluster/scripts/write-dummy-secret.py",
-        "-f",
-        secret["path"],
-        "-c",
-        secret["content"],
+    Dummy secrets are written first, so that real ones take precedence.
+    """
+    manifest = run.pop("dummy-secrets", []) + [
+        dict(secret) for secret in run.get("secrets", [])
+    ]
+    if not manifest:
+        return []
+    return [
+        [
+            "taskcluster/scripts/write-secrets.py",
+            json.dumps(manifest, sort_keys=True, separators=(",", ":")),
+        ]
     ]
-    if secret.get("json"):
-        secret_command.append("--json")
-
-    return secret_command
 
 
 def _convert_commands_to_string(commands):
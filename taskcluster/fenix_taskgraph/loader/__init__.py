@@ -4,6 +4,8 @@
 
 import copy
 
+from fenix_taskgraph.util.task_index import get_loaded_tasks_index
+
 
 # Define a collection of group_by functions
 GROUP_BY_MAP = {}
@@ -17,62 +19,69 @@ def group_by(name):
     return wrapper
 
 
-def group_tasks(config, tasks):
+def group_tasks(config, params, tasks):
     group_by_fn = GROUP_BY_MAP[config["group-by"]]
 
-    groups = group_by_fn(config, tasks)
+    groups = group_by_fn(config, get_loaded_tasks_index(params, tasks))
 
     for combinations in groups.values():
         dependencies = [copy.deepcopy(t) for t in combinations]
         yield dependencies
 
 
-@group_by("build-type")
-def build_type_grouping(config, tasks):
+def group_by_keys(config, tasks_index, get_group_keys, attributes=None):
+    """Group the tasks of `kind-dependencies` by the keys `get_group_keys` returns.
+
+    Tasks are looked up in `tasks_index`, the index of loaded tasks, optionally
+    filtered by indexed `attributes` (see `TaskIndex.get_tasks()`). Keys are
+    computed once per task. A task can belong to several groups but appears at
+    most once in each of them. Groups and the tasks in them keep the order in which they
+    were first seen.
+    """
+    candidate_tasks = tasks_index.get_tasks(
+        kinds=config.get("kind-dependencies") or [], attributes=attributes
+    )
     groups = {}
-    kind_dependencies = config.get("kind-dependencies")
-    only_build_type = config.get("only-for-build-types")
 
-    for task in tasks:
-        if task.kind not in kind_dependencies:
-            continue
+    for task in candidate_tasks:
+        for key in get_group_keys(task):
+            # Labels are unique, so they're used to check membership
+            groups.setdefault(key, {}).setdefault(task.label, task)
 
-        if only_build_type:
-            build_type = task.attributes.get("build-type")
-            if build_type not in only_build_type:
-                continue
+    return {
+        key: list(tasks_per_label.values()) for key, tasks_per_label in groups.items()
+    }
 
-        build_type = task.attributes.get("build-type")
 
-        groups.setdefault(build_type, []).append(task)
+@group_by("build-type")
+def build_type_grouping(config, tasks_index):
+    only_build_type = config.get("only-for-build-types")
 
-    return groups
+    def get_group_keys(task):
+        return [task.attributes.get("build-type")]
+
+    return group_by_keys(
+        config,
+        tasks_index,
+        get_group_keys,
+        attributes={"build-type": only_build_type} if only_build_type else None,
+    )
 
 
 @group_by("attributes")
-def attributes_grouping(config, tasks):
-    groups = {}
-    kind_dependencies = config.get("kind-dependencies")
+def attributes_grouping(config, tasks_index):
     only_attributes = config.get("only-for-attributes")
 
-    for task in tasks:
-        if task.kind not in kind_dependencies:
-            continue
-
-        group_attr = None
-        if only_attributes:
-            if not any(attr in task.attributes for attr in only_attributes):
-                continue
-        else:
-            continue
+    def get_group_keys(task):
+        if only_attributes and any(attr in task.attributes for attr in only_attributes):
+            return [task.label]
+        return []
 
-        groups.setdefault(task.label, []).append(task)
-
-    return groups
+    return group_by_keys(config, tasks_index, get_group_keys)
 
 
 @group_by("single-locale")
-def single_locale_grouping(config, tasks):
+def single_locale_grouping(config, tasks_index):
     """Split by a single locale (but also by platform, build-type, product)
 
     The locale can be `None` (en-US build/signing/repackage), a single locale,
@@ -83,22 +92,14 @@ def single_locale_grouping(config, tasks):
     be useful elsewhere.
 
     """
-    groups = {}
-
-    for task in tasks:
-        if task.kind not in config.get("kind-dependencies", []):
-            continue
 
+    def get_group_keys(task):
         platform = task.attributes.get("build_platform")
         build_type = task.attributes.get("build_type")
         task_locale = task.attributes.get("locale")
         chunk_locales = task.attributes.get("chunk_locales")
         locales = chunk_locales or [task_locale]
 
-        for locale in locales:
-            locale_key = (platform, build_type, locale)
-            groups.setdefault(locale_key, [])
-            if task not in groups[locale_key]:
-                groups[locale_key].append(task)
+        return [(platform, build_type, locale) for locale in locales]
 
-    return groups
+    return group_by_keys(config, tasks_index, get_group_keys)
@@ -39,7 +39,7 @@ def loader(kind, path, config, params, loaded_tasks):
     """
     job_template = config.get("job-template")
 
-    for dep_tasks in group_tasks(config, loaded_tasks):
+    for dep_tasks in group_tasks(config, params, loaded_tasks):
         kinds = [dep.kind for dep in dep_tasks]
         kinds_occurrences = {kind: kinds.count(kind) for kind in kinds}
 
@@ -62,6 +62,8 @@ def get_primary_dep(config, dep_tasks):
     then find the first dep with that task kind and return it. If it is
     defined and is a list, the first kind in that list with a matching dep
     is the primary dependency. If it's undefined, return the first dep.
+    ABI shards of a build (see `fenix_taskgraph.transforms.build`) are all
+    equivalent: the first one is returned.
     """
     primary_dependencies = config.get("primary-dependency")
     if isinstance(primary_dependencies, str):
@@ -71,14 +73,16 @@ def get_primary_dep(config, dep_tasks):
         return dep_tasks.values()[0]
     primary_dep = None
     for primary_kind in primary_dependencies:
-        for dep_kind in dep_tasks:
-            if dep_kind == primary_kind:
+        for dep in dep_tasks.values():
+            if dep.kind == primary_kind:
+                if primary_dep is not None and "abi-shard" in dep.attributes:
+                    continue
                 assert (
                     primary_dep is None
                 ), "Too many primary dependent tasks in dep_tasks: {}!".format(
-                    [t.label for t in dep_tasks]
+                    [t.label for t in dep_tasks.values()]
                 )
-                primary_dep = dep_tasks[dep_kind]
+                primary_dep = dep
     if primary_dep is None:
         raise Exception(
             "Can't find dependency of {}: {}".format(
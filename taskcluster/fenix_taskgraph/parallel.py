@@ -0,0 +1,190 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Generate a graph for every parameters file of `taskcluster/test/params` in parallel.
+
+Variants and the YAML files of `taskcluster/ci` are loaded once, before worker
+processes are forked, so every worker shares them instead of computing them
+again. Outputs of every generation are gathered into a single report. Run it
+from the `taskcluster` directory::
+
+    python3 -m fenix_taskgraph.parallel --graph target --output report.json
+"""
+
+import argparse
+import copy
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import taskgraph.config
+import taskgraph.generator
+import taskgraph.loader.transform
+import taskgraph.util.docker
+from taskgraph.util.yaml import load_yaml
+
+from fenix_taskgraph.benchmark import (
+    GRAPHS,
+    ROOT_DIR,
+    get_default_params_paths,
+    get_params_name,
+)
+from fenix_taskgraph.gradle import get_variant_registry
+
+
+CI_DIR = os.path.join(ROOT_DIR, "taskcluster", "ci")
+# Modules of taskgraph which load the YAML files of `taskcluster/ci`
+YAML_LOADING_MODULES = (
+    taskgraph.config,
+    taskgraph.generator,
+    taskgraph.loader.transform,
+    taskgraph.util.docker,
+)
+
+_yaml_cache = {}
+
+
+def cached_load_yaml(*parts):
+    path = os.path.abspath(os.path.join(*parts))
+    key = (path, os.stat(path).st_mtime_ns)
+    if key not in _yaml_cache:
+        _yaml_cache[key] = load_yaml(path)
+    # Loaders and transforms may modify what they're given
+    return copy.deepcopy(_yaml_cache[key])
+
+
+def warm_caches():
+    for module in YAML_LOADING_MODULES:
+        module.load_yaml = cached_load_yaml
+
+    for dir_path, _, file_names in os.walk(CI_DIR):
+        for file_name in file_names:
+            if file_name.endswith(".yml"):
+                cached_load_yaml(dir_path, file_name)
+
+    get_variant_registry()
+
+
+def generate_graph(params_path, graph, include_tasks=False):
+    from taskgraph.parameters import parameters_loader
+
+    logging.getLogger().setLevel(logging.WARNING)
+    result = {"params": params_path}
+    start = time.monotonic()
+    try:
+        parameters = parameters_loader(params_path, strict=False)
+        generator = taskgraph.generator.TaskGraphGenerator(
+            root_dir=None, parameters=parameters
+        )
+        task_graph = getattr(generator, GRAPHS[graph])
+    except Exception:
+        result["error"] = traceback.format_exc()
+        return result
+    result["wall_time"] = time.monotonic() - start
+
+    tasks_per_kind = {}
+    for task in task_graph.tasks.values():
+        tasks_per_kind[task.kind] = tasks_per_kind.get(task.kind, 0) + 1
+    result["tasks_per_kind"] = tasks_per_kind
+    result["labels"] = sorted(task_graph.tasks)
+    if include_tasks:
+        result["tasks"] = task_graph.to_json()
+    return result
+
+
+def generate_graphs(params_paths, graph, jobs=None, include_tasks=False):
+    """Return the outputs of each generation, keyed by name of parameters"""
+    os.chdir(ROOT_DIR)
+    warm_caches()
+
+    results = {}
+    # Workers must be forked to inherit the warmed caches
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+        futures = {
+            executor.submit(generate_graph, params_path, graph, include_tasks): (
+                params_path
+            )
+            for params_path in params_paths
+        }
+        for future in as_completed(futures):
+            results[get_params_name(futures[future])] = future.result()
+    return results
+
+
+def format_report(results):
+    lines = []
+    for params_name, result in sorted(results.items()):
+        if "error" in result:
+            lines.append("{:<32} FAILED".format(params_name))
+        else:
+            lines.append(
+                "{:<32} {:>5} tasks  {:>6.2f}s".format(
+                    params_name, len(result["labels"]), result["wall_time"]
+                )
+            )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a graph for many parameters files in parallel."
+    )
+    parser.add_argument(
+        "-p",
+        "--parameters",
+        dest="params_paths",
+        action="append",
+        help="parameters file (default: all of taskcluster/test/params)",
+    )
+    parser.add_argument(
+        "--graph", choices=list(GRAPHS), default="full", help="graph to generate"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, help="number of processes (default: CPU count)"
+    )
+    parser.add_argument("--output", help="file to write the JSON report to")
+    parser.add_argument(
+        "--include-tasks",
+        action="store_true",
+        help="include the definition of every task in the report",
+    )
+
+    result = parser.parse_args()
+    params_paths = [
+        os.path.abspath(params_path)
+        for params_path in result.params_paths or get_default_params_paths()
+    ]
+
+    start = time.monotonic()
+    results = generate_graphs(
+        params_paths, result.graph, result.jobs, result.include_tasks
+    )
+    print(format_report(results))
+    print(
+        "Generated {} graphs in {:.2f}s".format(len(results), time.monotonic() - start)
+    )
+
+    if result.output:
+        with open(result.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    errors = {
+        params_name: result["error"]
+        for params_name, result in results.items()
+        if "error" in result
+    }
+    for params_name, error in sorted(errors.items()):
+        print("{} failed:\n{}".format(params_name, error), file=sys.stderr)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Detect performance regressions in a store of browsertime results.
+
+Each series holds the results of a subtest on an ABI, with or without fission,
+ordered by push date (see `fenix_taskgraph.perf_store`). Every revision of
+every series is tested as a change point: the replicates of the `--window`
+revisions before it are compared with the ones of the revisions after it by a
+Welch t-test and a Mann-Whitney U test, corrected for ties. The last revisions
+are compared with the fewer revisions after them, down to `--min-after`; the
+ones after are reported as not having enough data yet. Run it from the
+`taskcluster` directory::
+
+    python3 -m fenix_taskgraph.perf_regressions perf.npz --json regressions.json
+
+Revisions are ranked by how many series regressed at them, then by the size of
+their largest regression. It requires the dependencies of
+`taskcluster/requirements-perf.in`.
+"""
+
+import argparse
+import json
+from statistics import NormalDist
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from fenix_taskgraph.perf_store import PerfStore
+
+SERIES_COLUMNS = ("test", "subtest", "abi", "fission")
+# Fewest revisions after a candidate to test it
+MIN_AFTER = 3
+# Most replicates of the windows compared at once
+CHUNK_SIZE = 2**22
+
+
+def build_series(store, mask):
+    """Return the series of the selected rows of `store`.
+
+    Returns the key of each series, and an array of the replicates of each of
+    its revisions, in push order. Replicates of a revision with many results,
+    e.g. retriggers, are pooled. Results without replicates count as a single
+    replicate, their value. Series are left-aligned, and both revisions and
+    replicates are padded with NaN. A matrix of the revision of each cell and
+    the direction of each series are returned too.
+    """
+    group_by = SERIES_COLUMNS + ("lower_is_better", "push_date", "revision")
+    keys = np.rec.fromarrays([store.columns[column][mask] for column in group_by])
+    groups, group_index = np.unique(keys, return_inverse=True)
+    group_index = group_index.ravel()
+    names = groups.dtype.names
+
+    # Flatten the replicates of the rows, or their value when they have none
+    counts = store.columns["replicate_count"][mask]
+    sizes = np.maximum(counts, 1)
+    offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    replicates = store.get_replicates(mask)
+    replicate_indices = np.repeat(np.cumsum(counts) - counts, sizes) + offsets
+    values = np.where(
+        np.repeat(counts > 0, sizes),
+        (
+            replicates[np.minimum(replicate_indices, max(len(replicates) - 1, 0))]
+            if len(replicates)
+            else np.nan
+        ),
+        np.repeat(store.columns["value"][mask], sizes),
+    )
+
+    # Pool the replicates of the rows of each group
+    value_groups = np.repeat(group_index, sizes)
+    value_order = np.argsort(value_groups, kind="stable")
+    group_sizes = np.bincount(value_groups, minlength=len(groups))
+    replicate_positions = np.arange(len(values)) - np.repeat(
+        np.cumsum(group_sizes) - group_sizes, group_sizes
+    )
+
+    series_keys = np.rec.fromarrays(
+        [groups[name] for name in names[: len(SERIES_COLUMNS)]]
+    )
+    series, series_index = np.unique(series_keys, return_inverse=True)
+    series_index = series_index.ravel()
+    push_dates = groups[names[len(SERIES_COLUMNS) + 1]]
+    order = np.lexsort((push_dates, series_index))
+
+    revision_counts = np.bincount(series_index, minlength=len(series))
+    starts = np.cumsum(revision_counts) - revision_counts
+    positions = np.empty(len(groups), dtype=np.int64)
+    positions[order] = np.arange(len(order)) - starts[series_index[order]]
+
+    shape = (len(series), revision_counts.max(initial=0))
+    matrix = np.full(shape + (group_sizes.max(initial=0),), np.nan)
+    sorted_groups = value_groups[value_order]
+    matrix[
+        series_index[sorted_groups], positions[sorted_groups], replicate_positions
+    ] = values[value_order]
+    revisions = np.full(shape, "", dtype=groups[names[-1]].dtype)
+    revisions[series_index, positions] = groups[names[-1]]
+    lower_is_better = np.ones(len(series), dtype=bool)
+    lower_is_better[series_index] = groups[names[len(SERIES_COLUMNS)]]
+    return series, matrix, revisions, lower_is_better
+
+
+def _window_sums(cumulative, starts, ends):
+    """Return the sums of the windows of revisions between `starts` and `ends`
+    along the second axis, given the cumulative sums along it."""
+    return np.take(cumulative, ends, axis=1) - np.take(cumulative, starts, axis=1)
+
+
+def _cumulative(values, axis=1):
+    """Return the cumulative sums of `values` along `axis`, starting at 0"""
+    padding = [(0, 0)] * values.ndim
+    padding[axis] = (1, 0)
+    return np.pad(np.cumsum(values, axis=axis), padding)
+
+
+def _rank_revisions(matrix):
+    """Compare the replicates of every pair of revisions of each series.
+
+    Replicates of each series are sorted once, and equal ones are grouped in
+    runs. Returns the U statistic of every revision against every other one,
+    i.e. the number of pairs of replicates where the one of the first revision
+    is the highest, ties counting for half. Also returns the series of the runs
+    of ties and their number of replicates of each revision.
+    """
+    series_count, revision_count, replicate_count = matrix.shape
+    values = matrix.reshape(series_count, -1)
+    # NaN are sorted last
+    order = np.argsort(values, axis=-1, kind="stable")
+    sorted_values = np.take_along_axis(values, order, axis=-1)
+    valid = ~np.isnan(sorted_values)
+
+    run_starts = np.ones(sorted_values.shape, dtype=bool)
+    run_starts[..., 1:] = sorted_values[..., 1:] != sorted_values[..., :-1]
+    runs = np.cumsum(run_starts, axis=-1) - 1
+    size = runs[valid].max(initial=0) + 1
+
+    # Number of replicates of each revision in each run. Counts and U
+    # statistics are sums of halves, exact as 32-bit floats.
+    series_indices = np.broadcast_to(np.arange(series_count)[:, None], runs.shape)
+    cells = (series_indices * revision_count + order // replicate_count) * size + runs
+    run_counts = (
+        np.bincount(cells[valid], minlength=series_count * revision_count * size)
+        .astype(np.float32)
+        .reshape(series_count, revision_count, size)
+    )
+
+    # Replicates of a run are higher than the ones of previous runs, and tie
+    # with the ones of their run
+    scores = np.cumsum(run_counts, axis=-1)
+    scores -= run_counts / 2
+    u = np.matmul(run_counts, np.swapaxes(scores, 1, 2)).astype(np.float64)
+
+    tied_series, tied_runs = np.nonzero(run_counts.sum(axis=1) > 1)
+    return u, tied_series, run_counts[tied_series, :, tied_runs]
+
+
+def _get_medians(matrix, window):
+    """Return the median of the replicates of the `window` revisions starting
+    at each position, or of the ones left at the end of series."""
+    padded = np.pad(matrix, ((0, 0), (0, window - 1), (0, 0)), constant_values=np.nan)
+    windows = sliding_window_view(padded, window, axis=1)
+    # NaN are sorted last
+    windows = np.sort(windows.reshape(windows.shape[:2] + (-1,)), axis=-1)
+    counts = (~np.isnan(windows)).sum(axis=-1, keepdims=True)
+    middles = np.concatenate([(counts - 1) // 2, counts // 2], axis=-1)
+    medians = np.take_along_axis(windows, np.maximum(middles, 0), axis=-1).mean(-1)
+    return np.where(counts[..., 0] > 0, medians, np.nan)
+
+
+def _detect_chunk_change_points(matrix, window, min_after):
+    series_count, revision_count = matrix.shape[:2]
+    positions = np.arange(window, revision_count)
+    before_starts = positions - window
+    after_ends = np.minimum(positions + window, revision_count)
+
+    present = ~np.isnan(matrix)
+    revision_counts = present.any(axis=-1).sum(axis=-1)
+    valid = revision_counts[:, None] - positions >= min_after
+
+    # Center values on each series, so that sums of squares don't lose precision
+    centered = matrix - np.nanmean(matrix, axis=(1, 2), keepdims=True)
+    counts = _cumulative(present.sum(axis=-1))
+    sums = _cumulative(np.nansum(centered, axis=-1))
+    squares = _cumulative(np.nansum(centered**2, axis=-1))
+    n_before = _window_sums(counts, before_starts, positions)
+    n_after = _window_sums(counts, positions, after_ends)
+
+    # Sum the U statistics of the revisions after candidates against the ones
+    # before them
+    u, tied_series, tied_counts = _rank_revisions(matrix)
+    u_sums = _cumulative(_cumulative(u, axis=1), axis=2)
+    u = (
+        u_sums[:, after_ends, positions]
+        - u_sums[:, positions, positions]
+        - u_sums[:, after_ends, before_starts]
+        + u_sums[:, positions, before_starts]
+    )
+
+    # Correct for the runs of t ties in the windows by the sum of t³ - t
+    tie_counts = _window_sums(_cumulative(tied_counts), before_starts, after_ends)
+    tie_sums = _cumulative(tie_counts**3 - tie_counts, axis=0)
+    # Runs are ordered by series
+    bounds = np.searchsorted(tied_series, np.arange(series_count + 1))
+    ties = tie_sums[bounds[1:]] - tie_sums[bounds[:-1]]
+
+    medians = _get_medians(matrix, window)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_before = _window_sums(sums, before_starts, positions) / n_before
+        mean_after = _window_sums(sums, positions, after_ends) / n_after
+        variance_before = (
+            _window_sums(squares, before_starts, positions) - n_before * mean_before**2
+        ) / (n_before - 1)
+        variance_after = (
+            _window_sums(squares, positions, after_ends) - n_after * mean_after**2
+        ) / (n_after - 1)
+        difference = mean_after - mean_before
+        variance = (
+            np.maximum(variance_before, 0) / n_before
+            + np.maximum(variance_after, 0) / n_after
+        )
+        # Constant series change by an infinite t when they change at all
+        t = np.where(
+            variance > 0, difference / np.sqrt(variance), np.sign(difference) * np.inf
+        )
+
+        n = n_before + n_after
+        u_variance = n_before * n_after / 12 * ((n + 1) - ties / (n * (n - 1)))
+        # All values are equal when the variance is null
+        z = np.where(
+            u_variance > 0, (u - n_before * n_after / 2) / np.sqrt(u_variance), 0.0
+        )
+        cliffs_delta = 2 * u / (n_before * n_after) - 1
+
+        median_before = medians[:, before_starts]
+        change = (medians[:, positions] - median_before) / np.abs(median_before)
+
+    for statistic in (t, z, change, cliffs_delta):
+        statistic[~valid] = np.nan
+    return t, z, change, cliffs_delta
+
+
+def detect_change_points(matrix, window, min_after=MIN_AFTER, chunk_size=CHUNK_SIZE):
+    """Test every point of every series as a change point.
+
+    Returns, for each series and candidate, the Welch t statistic and the z
+    score of the Mann-Whitney U test of the replicates of the `window`
+    revisions after the candidate against the ones of the `window` revisions
+    before it, the relative change of their medians and Cliff's delta.
+    Candidate `j` is the revision at position `j + window`. The last revisions
+    of a series are compared with the fewer revisions after them, down to
+    `min_after`. Candidates without enough revisions around them get NaN.
+
+    Replicates of each series are ranked once, and the statistics of all the
+    windows are derived from cumulative sums. Series are processed in chunks
+    of about `chunk_size` values, to bound memory.
+    """
+    shape = (matrix.shape[0], max(matrix.shape[1] - window, 0))
+    statistics = tuple(np.full(shape, np.nan) for _ in range(4))
+    if not shape[1]:
+        return statistics
+
+    # Largest arrays hold a value per replicate and revision of a series
+    values = matrix.shape[1] * matrix.shape[1] * matrix.shape[2]
+    step = max(chunk_size // max(values, 1), 1)
+    for start in range(0, matrix.shape[0], step):
+        chunk = _detect_chunk_change_points(
+            matrix[start : start + step], window, min_after
+        )
+        for statistic, chunk_statistic in zip(statistics, chunk):
+            statistic[start : start + step] = chunk_statistic
+    return statistics
+
+
+def find_regressions(
+    store,
+    mask,
+    window=12,
+    t_threshold=7.0,
+    alpha=0.01,
+    min_change=0.02,
+    min_after=MIN_AFTER,
+):
+    """Return the most likely regression of every series which regressed.
+
+    The last `min_after - 1` revisions of each series can't be tested yet, and
+    are returned too, as series keys with the `revisions` without enough data.
+    """
+    series, matrix, revisions, lower_is_better = build_series(store, mask)
+    revision_counts = (revisions != "").sum(axis=1)
+    untested = []
+    for series_index, count in enumerate(revision_counts):
+        first_untested = max(count - min_after + 1, window)
+        trailing = revisions[series_index, first_untested:count]
+        if len(trailing):
+            key = dict(zip(SERIES_COLUMNS, series[series_index].tolist()))
+            key["revisions"] = [str(revision) for revision in trailing]
+            untested.append(key)
+    if matrix.shape[1] <= window:
+        return [], untested
+
+    t, z, change, cliffs_delta = detect_change_points(matrix, window, min_after)
+    # Regressions make values higher when lower is better, and lower otherwise
+    direction = np.where(lower_is_better, 1.0, -1.0)[:, None]
+    t, z, change, cliffs_delta = (
+        statistic * direction for statistic in (t, z, change, cliffs_delta)
+    )
+
+    # Normal approximation of the one-sided p-value of the U test
+    z_threshold = NormalDist().inv_cdf(1 - alpha)
+    regressed = (t >= t_threshold) & (z >= z_threshold) & (change >= min_change)
+    best = np.where(regressed, t, -np.inf).argmax(axis=1)
+    series_indices = np.flatnonzero(regressed.any(axis=1))
+
+    regressions = []
+    for series_index in series_indices:
+        candidate = best[series_index]
+        key = dict(zip(SERIES_COLUMNS, series[series_index].tolist()))
+        key.update(
+            {
+                "revision": str(revisions[series_index, candidate + window]),
+                "previous_revision": str(
+                    revisions[series_index, candidate + window - 1]
+                ),
+                "t": float(t[series_index, candidate]),
+                "p_value": 1 - NormalDist().cdf(z[series_index, candidate]),
+                "change": float(change[series_index, candidate]),
+                "cliffs_delta": float(cliffs_delta[series_index, candidate]),
+            }
+        )
+        regressions.append(key)
+    return regressions, untested
+
+
+def rank_revisions(regressions):
+    revisions = {}
+    for regression in regressions:
+        revision = revisions.setdefault(
+            regression["revision"],
+            {"revision": regression["revision"], "max_change": 0.0, "regressions": []},
+        )
+        revision["regressions"].append(regression)
+        revision["max_change"] = max(revision["max_change"], regression["change"])
+    return sorted(
+        revisions.values(),
+        key=lambda revision: (len(revision["regressions"]), revision["max_change"]),
+        reverse=True,
+    )
+
+
+def format_ranking(ranking):
+    lines = []
+    for revision in ranking:
+        lines.append(
+            "{} ({} series, up to {:+.1%})".format(
+                revision["revision"],
+                len(revision["regressions"]),
+                revision["max_change"],
+            )
+        )
+        for regression in sorted(
+            revision["regressions"], key=lambda regression: -regression["change"]
+        ):
+            lines.append(
+                "    {:+7.1%}  delta {:+.2f}  p {:.1e}  {} {} {}{}".format(
+                    regression["change"],
+                    regression["cliffs_delta"],
+                    regression["p_value"],
+                    regression["test"],
+                    regression["subtest"],
+                    regression["abi"],
+                    "" if regression["fission"] else " nofis",
+                )
+            )
+    return "\n".join(lines)
+
+
+def format_untested(untested):
+    revisions = {}
+    for series in untested:
+        for revision in series["revisions"]:
+            revisions[revision] = revisions.get(revision, 0) + 1
+    return "Not enough data yet to test {}".format(
+        ", ".join(
+            "{} ({} series)".format(revision, count)
+            for revision, count in revisions.items()
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rank revisions by the performance regressions they caused."
+    )
+    parser.add_argument("store", help="store file of fenix_taskgraph.perf_store")
+    for column in ("test", "subtest", "abi"):
+        parser.add_argument(
+            "--{}".format(column),
+            action="append",
+            help="only analyze series of this {} (can be repeated)".format(column),
+        )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=12,
+        help="number of revisions compared before and after a change (default: 12)",
+    )
+    parser.add_argument(
+        "--t-threshold",
+        type=float,
+        default=7.0,
+        help="minimum t statistic of a regression (default: 7)",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.01,
+        help="significance level of the Mann-Whitney U test (default: 0.01)",
+    )
+    parser.add_argument(
+        "--min-change",
+        type=float,
+        default=0.02,
+        help="minimum relative change of the median (default: 0.02)",
+    )
+    parser.add_argument(
+        "--min-after",
+        type=int,
+        default=MIN_AFTER,
+        help="fewest revisions after a change to test it (default: {})".format(
+            MIN_AFTER
+        ),
+    )
+    parser.add_argument("--json", help="file to write the ranked revisions to")
+
+    result = parser.parse_args()
+    store = PerfStore.load(result.store)
+    mask = store.select(test=result.test, subtest=result.subtest, abi=result.abi)
+    regressions, untested = find_regressions(
+        store,
+        mask,
+        window=result.window,
+        t_threshold=result.t_threshold,
+        alpha=result.alpha,
+        min_change=result.min_change,
+        min_after=result.min_after,
+    )
+    ranking = rank_revisions(regressions)
+    print(format_ranking(ranking))
+    if untested:
+        print(format_untested(untested))
+
+    if result.json:
+        with open(result.json, "w") as f:
+            json.dump(ranking, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Columnar store of browsertime results, to analyze them across revisions.
+
+Results are the `perfherder-data.json` files browsertime tasks upload under
+`public/test_info`. They're ingested from the graphs of decision tasks, either
+downloaded from Taskcluster (or a local stand-in of its queue, given with
+`--root-url`) or read from a directory laid out like the artifacts of the
+queue: `<directory>/<task id>/<artifact path>`. Run it from the `taskcluster`
+directory::
+
+    python3 -m fenix_taskgraph.perf_store ingest perf.npz <decision task id>...
+    python3 -m fenix_taskgraph.perf_store query perf.npz --subtest loadtime \\
+        --last 30 --group-by test
+
+The store is a NumPy `.npz` archive, with one array per column and one row per
+subtest of each task. String columns are dictionary-encoded. It requires the
+dependencies of `taskcluster/requirements-perf.in`, which graph generation
+doesn't.
+"""
+
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from taskgraph.util.taskcluster import get_artifact
+from taskgraph.util.yaml import load_yaml
+
+
+logger = logging.getLogger(__name__)
+
+PERFHERDER_DATA_PATH = "public/test_info/perfherder-data.json"
+
+STRING_COLUMNS = ("task_id", "revision", "test", "subtest", "abi")
+COLUMNS = STRING_COLUMNS + (
+    "push_date",
+    "fission",
+    "lower_is_better",
+    "value",
+    "replicate_start",
+    "replicate_count",
+)
+COLUMN_TYPES = {
+    "push_date": np.int64,
+    "fission": np.bool_,
+    "lower_is_better": np.bool_,
+    "value": np.float64,
+    "replicate_start": np.int64,
+    "replicate_count": np.int64,
+}
+
+
+class ArtifactSource:
+    """Artifacts of tasks, read from `directory` or downloaded from Taskcluster"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+
+    def get(self, task_id, path):
+        if self.directory is None:
+            return get_artifact(task_id, path)
+
+        file_path = os.path.join(self.directory, task_id, path)
+        if path.endswith(".json"):
+            with open(file_path) as f:
+                return json.load(f)
+        return load_yaml(file_path)
+
+
+class PerfStore:
+    def __init__(self, columns=None, replicates=None):
+        self.columns = columns or {
+            column: np.array([], dtype=COLUMN_TYPES.get(column, str))
+            for column in COLUMNS
+        }
+        self.replicates = (
+            replicates if replicates is not None else np.array([], dtype=np.float64)
+        )
+
+    def __len__(self):
+        return len(self.columns["value"])
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            columns = {
+                column: (
+                    data["{}_values".format(column)][data[column]]
+                    if column in STRING_COLUMNS
+                    else data[column]
+                )
+                for column in COLUMNS
+            }
+            return cls(columns, data["replicates"])
+
+    def save(self, path):
+        arrays = {"replicates": self.replicates}
+        for column in COLUMNS:
+            if column in STRING_COLUMNS:
+                values, codes = np.unique(self.columns[column], return_inverse=True)
+                arrays[column] = codes.astype(np.int32)
+                arrays["{}_values".format(column)] = values
+            else:
+                arrays[column] = self.columns[column]
+        np.savez_compressed(path, **arrays)
+
+    def extend(self, rows, replicates):
+        """Append `rows`, dicts of column values, with their flattened `replicates`.
+
+        `replicate_start` of each row is relative to `replicates`.
+        """
+        if not rows:
+            return
+        new_columns = {
+            column: np.array(
+                [row[column] for row in rows], dtype=COLUMN_TYPES.get(column, str)
+            )
+            for column in COLUMNS
+        }
+        new_columns["replicate_start"] += len(self.replicates)
+        self.columns = {
+            column: np.concatenate([self.columns[column], new_columns[column]])
+            for column in COLUMNS
+        }
+        self.replicates = np.concatenate(
+            [self.replicates, np.array(replicates, dtype=np.float64)]
+        )
+
+    def select(self, **filters):
+        """Return the mask of rows whose columns match `filters`.
+
+        A filter is either a value or a list of accepted values. `None` filters
+        are ignored.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for column, value in filters.items():
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set)):
+                mask &= np.isin(self.columns[column], list(value))
+            else:
+                mask &= self.columns[column] == value
+        return mask
+
+    def last_revisions(self, count, mask=None):
+        """Return the `count` most recently pushed revisions among selected rows"""
+        if mask is None:
+            mask = np.ones(len(self), dtype=bool)
+        revisions, first_rows = np.unique(
+            self.columns["revision"][mask], return_index=True
+        )
+        push_dates = self.columns["push_date"][mask][first_rows]
+        return revisions[np.argsort(push_dates, kind="stable")][-count:]
+
+    def get_replicates(self, mask):
+        """Return the replicates of the selected rows, concatenated in row order"""
+        starts = self.columns["replicate_start"][mask]
+        counts = self.columns["replicate_count"][mask]
+        # Index of every replicate: the start of its row plus its rank in it
+        row_offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return self.replicates[row_offsets + np.arange(counts.sum())]
+
+    def aggregate(self, mask, group_by, statistic="median"):
+        """Return the groups of selected rows and the `statistic` of their values.
+
+        Groups are the distinct values of the `group_by` columns. Medians are
+        computed for all groups at once, by sorting values within groups.
+        """
+        values = self.columns["value"][mask]
+        keys = np.rec.fromarrays([self.columns[column][mask] for column in group_by])
+        groups, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.ravel()
+        counts = np.bincount(inverse, minlength=len(groups))
+
+        if statistic == "mean":
+            results = np.bincount(inverse, weights=values, minlength=len(groups))
+            return groups, results / counts, counts
+
+        order = np.lexsort((values, inverse))
+        sorted_values = values[order]
+        starts = np.cumsum(counts) - counts
+        results = (
+            sorted_values[starts + (counts - 1) // 2]
+            + sorted_values[starts + counts // 2]
+        ) / 2
+        return groups, results, counts
+
+
+def _get_task_rows(source, task_id, task, parameters):
+    try:
+        perfherder_data = source.get(task_id, PERFHERDER_DATA_PATH)
+    except (OSError, requests.HTTPError) as error:
+        logger.warning("No results for {}: {}".format(task["label"], error))
+        return [], []
+
+    rows = []
+    replicates = []
+    # A task can report many perfherder data blobs
+    if isinstance(perfherder_data, dict):
+        perfherder_data = [perfherder_data]
+    for data in perfherder_data:
+        for suite in data.get("suites", []):
+            for subtest in suite.get("subtests", []):
+                if subtest.get("value") is None:
+                    continue
+                subtest_replicates = subtest.get("replicates", [])
+                rows.append(
+                    {
+                        "task_id": task_id,
+                        "revision": parameters["head_rev"],
+                        "test": suite["name"],
+                        "subtest": subtest["name"],
+                        "abi": task["attributes"].get("abi", ""),
+                        "push_date": parameters["build_date"],
+                        "fission": not task["label"].endswith("-nofis"),
+                        "lower_is_better": subtest.get(
+                            "lowerIsBetter", suite.get("lowerIsBetter", True)
+                        ),
+                        "value": subtest["value"],
+                        "replicate_start": len(replicates),
+                        "replicate_count": len(subtest_replicates),
+                    }
+                )
+                replicates.extend(subtest_replicates)
+    return rows, replicates
+
+
+def ingest(store, source, decision_task_ids, jobs=None):
+    """Add the results of the browsertime tasks of the given graphs to `store`"""
+    known_task_ids = set(store.columns["task_id"].tolist())
+
+    for decision_task_id in decision_task_ids:
+        parameters = source.get(decision_task_id, "public/parameters.yml")
+        task_graph = source.get(decision_task_id, "public/task-graph.json")
+        tasks = {
+            task_id: task
+            for task_id, task in task_graph.items()
+            if task["attributes"].get("kind") == "browsertime"
+            and task_id not in known_task_ids
+        }
+        logger.info(
+            "Ingesting {} tasks of revision {}".format(
+                len(tasks), parameters["head_rev"]
+            )
+        )
+
+        rows = []
+        replicates = []
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for task_rows, task_replicates in executor.map(
+                lambda item: _get_task_rows(source, item[0], item[1], parameters),
+                tasks.items(),
+            ):
+                # Starts are relative to the replicates of the task
+                for row in task_rows:
+                    row["replicate_start"] += len(replicates)
+                rows.extend(task_rows)
+                replicates.extend(task_replicates)
+        store.extend(rows, replicates)
+        known_task_ids.update(tasks)
+
+
+def format_aggregate(group_by, groups, results, counts):
+    lines = [
+        "  ".join(["{:<32}".format(column) for column in group_by])
+        + "  {:>12}  {:>6}".format("value", "count")
+    ]
+    for group, result, count in zip(groups, results, counts):
+        lines.append(
+            "  ".join(["{:<32}".format(str(value)) for value in group.tolist()])
+            + "  {:>12.2f}  {:>6}".format(result, count)
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Store browsertime results and query them across revisions."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser(
+        "ingest", help="add the results of the browsertime tasks of graphs"
+    )
+    ingest_parser.add_argument("store", help="store file, created if missing")
+    ingest_parser.add_argument(
+        "decision_task_ids",
+        nargs="+",
+        metavar="decision-task-id",
+        help="decision task of a graph which ran browsertime tasks",
+    )
+    ingest_parser.add_argument(
+        "--directory", help="read artifacts from this directory instead of the queue"
+    )
+    ingest_parser.add_argument(
+        "--root-url", help="root URL of the Taskcluster deployment to download from"
+    )
+    ingest_parser.add_argument(
+        "-j", "--jobs", type=int, help="number of concurrent downloads"
+    )
+
+    query_parser = subparsers.add_parser("query", help="aggregate stored results")
+    query_parser.add_argument("store", help="store file")
+    for column in ("test", "subtest", "abi", "revision"):
+        query_parser.add_argument(
+            "--{}".format(column),
+            action="append",
+            help="only use results of this {} (can be repeated)".format(column),
+        )
+    query_parser.add_argument(
+        "--fission",
+        action="store_true",
+        default=None,
+        help="only use results with fission enabled",
+    )
+    query_parser.add_argument(
+        "--no-fission",
+        dest="fission",
+        action="store_false",
+        default=None,
+        help="only use results with fission disabled",
+    )
+    query_parser.add_argument(
+        "--last", type=int, help="only use results of the last N pushed revisions"
+    )
+    query_parser.add_argument(
+        "--group-by",
+        default="test,subtest",
+        help="comma-separated columns to group results by (default: test,subtest)",
+    )
+    query_parser.add_argument(
+        "--statistic", choices=("median", "mean"), default="median"
+    )
+
+    result = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if result.command == "ingest":
+        if result.root_url:
+            os.environ["TASKCLUSTER_ROOT_URL"] = result.root_url
+        if os.path.exists(result.store):
+            store = PerfStore.load(result.store)
+        else:
+            store = PerfStore()
+        ingest(
+            store,
+            ArtifactSource(result.directory),
+            result.decision_task_ids,
+            jobs=result.jobs,
+        )
+        store.save(result.store)
+        logger.info("{} rows in {}".format(len(store), result.store))
+        return
+
+    store = PerfStore.load(result.store)
+    mask = store.select(
+        test=result.test,
+        subtest=result.subtest,
+        abi=result.abi,
+        revision=result.revision,
+        fission=result.fission,
+    )
+    if result.last:
+        mask &= store.select(revision=list(store.last_revisions(result.last, mask)))
+    group_by = result.group_by.split(",")
+    print(
+        format_aggregate(
+            group_by, *store.aggregate(mask, group_by, statistic=result.statistic)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,11 @@ from mozilla_version.fenix import FenixVersion
 from taskgraph.actions.registry import register_callback_action
 
 from taskgraph.util.taskcluster import get_artifact
-from taskgraph.taskgraph import TaskGraph
 from taskgraph.decision import taskgraph_decision
 from taskgraph.parameters import Parameters
-from taskgraph.util.taskgraph import (
-    find_decision_task,
+from taskgraph.util.taskgraph import find_decision_task
+
+from fenix_taskgraph.util.previous_graphs import (
     find_existing_tasks_from_previous_kinds,
 )
 
@@ -146,13 +146,8 @@ def release_promotion_action(parameters, graph_config, input, task_group_id, tas
     # that didn't exist in the first full_task_graph, so combining them is
     # important. The rightmost graph should take precedence in the case of
     # conflicts.
-    combined_full_task_graph = {}
-    for graph_id in previous_graph_ids:
-        full_task_graph = get_artifact(graph_id, "public/full-task-graph.json")
-        combined_full_task_graph.update(full_task_graph)
-    _, combined_full_task_graph = TaskGraph.from_json(combined_full_task_graph)
     parameters["existing_tasks"] = find_existing_tasks_from_previous_kinds(
-        combined_full_task_graph, previous_graph_ids, rebuild_kinds
+        previous_graph_ids, rebuild_kinds
     )
     parameters["do_not_optimize"] = do_not_optimize
     parameters["target_tasks_method"] = target_tasks_method
@@ -0,0 +1,326 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Resolve the variants `./gradlew printVariants` would report, without booting Gradle.
+
+Only the subset of the Android Gradle DSL that Fenix relies on is understood:
+build types (optionally composed with closures like ``releaseTemplate``), ABI
+splits and ``signingConfig`` declarations guarded by local properties. Anything
+else raises ``UnsupportedGradleConfiguration`` so callers can fall back to
+Gradle.
+"""
+
+import os
+import re
+
+
+class UnsupportedGradleConfiguration(Exception):
+    pass
+
+
+_LOCAL_PROPERTY_CONDITION = re.compile(
+    r"""^if\s*\(\s*gradle\.hasProperty\(\s*["']localProperties\.([\w.]+)["']\s*\)\s*\)$"""
+)
+_QUOTED_STRING = re.compile(r"""["']([^"']*)["']""")
+
+
+def _skip_string(text, start):
+    """Return the index right after the string literal starting at ``start``"""
+    for quote in ('"""', "'''", '"', "'"):
+        if text.startswith(quote, start):
+            break
+    index = start + len(quote)
+    while index < len(text):
+        if text[index] == "\\":
+            index += 2
+        elif text.startswith(quote, index):
+            return index + len(quote)
+        else:
+            index += 1
+    raise UnsupportedGradleConfiguration("Unterminated string literal")
+
+
+def _strip_comments(text):
+    stripped = []
+    index = 0
+    while index < len(text):
+        if text.startswith("//", index):
+            end = text.find("\n", index)
+            index = len(text) if end == -1 else end
+        elif text.startswith("/*", index):
+            end = text.find("*/", index)
+            if end == -1:
+                raise UnsupportedGradleConfiguration("Unterminated block comment")
+            index = end + 2
+        elif text[index] in "\"'":
+            end = _skip_string(text, index)
+            stripped.append(text[index:end])
+            index = end
+        else:
+            stripped.append(text[index])
+            index += 1
+    return "".join(stripped)
+
+
+def _split_statements(text):
+    """Split comment-free Groovy code into top-level statements.
+
+    Each statement is a ``(header, body)`` tuple. ``body`` is the content of the
+    braces following ``header``, or ``None`` for plain statements.
+    """
+    statements = []
+    header_start = 0
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if char in "\"'":
+            index = _skip_string(text, index)
+            continue
+
+        if char == "{":
+            depth = 1
+            body_start = index + 1
+            index += 1
+            while depth:
+                if index >= len(text):
+                    raise UnsupportedGradleConfiguration("Unbalanced braces")
+                if text[index] in "\"'":
+                    index = _skip_string(text, index)
+                    continue
+                if text[index] == "{":
+                    depth += 1
+                elif text[index] == "}":
+                    depth -= 1
+                index += 1
+            header = " ".join(text[header_start : body_start - 1].split())
+            statements.append((header, text[body_start : index - 1]))
+            header_start = index
+            continue
+
+        if char in "\n;":
+            header = " ".join(text[header_start:index].split())
+            # Statements can be continued on the next line (e.g. with `+` or `,`)
+            if header and not header.endswith(("+", ",", "(", "[", "=")):
+                statements.append((header, None))
+                header_start = index + 1
+            elif not header:
+                header_start = index + 1
+        index += 1
+
+    header = " ".join(text[header_start:].split())
+    if header:
+        statements.append((header, None))
+    return statements
+
+
+def _find_blocks(statements, name):
+    return [body for header, body in statements if body is not None and header == name]
+
+
+def _read_local_properties(root_dir):
+    properties = {}
+    try:
+        with open(os.path.join(root_dir, "local.properties")) as f:
+            lines = f.readlines()
+    except OSError:
+        return properties
+
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith(("#", "!")):
+            continue
+        key, _, value = line.partition("=")
+        properties[key.strip()] = value.strip()
+    return properties
+
+
+def _has_signing_config(statements, local_properties):
+    for header, body in statements:
+        if body is None:
+            if header.startswith("signingConfig"):
+                return True
+            continue
+
+        match = _LOCAL_PROPERTY_CONDITION.match(header)
+        if match:
+            if match.group(1) in local_properties and _has_signing_config(
+                _split_statements(body), local_properties
+            ):
+                return True
+        elif "signingConfig" in body:
+            raise UnsupportedGradleConfiguration(
+                'Cannot evaluate signing configuration guarded by "{}"'.format(header)
+            )
+    return False
+
+
+def _parse_build_types(script_statements, android_statements, local_properties):
+    templates = {}
+    for header, body in android_statements + script_statements:
+        match = re.match(r"^def (\w+) =$", header)
+        if match and body is not None:
+            templates[match.group(1)] = _split_statements(body)
+
+    # Build types can be configured in several `buildTypes` blocks
+    statements_per_build_type = {}
+    for build_types_body in _find_blocks(android_statements, "buildTypes"):
+        for header, body in _split_statements(build_types_body):
+            if body is None:
+                raise UnsupportedGradleConfiguration(
+                    'Unexpected statement in buildTypes: "{}"'.format(header)
+                )
+            match = re.match(r"^(\w+)(?: (\w+) >>)?$", header)
+            if not match:
+                raise UnsupportedGradleConfiguration(
+                    'Unexpected build type declaration: "{}"'.format(header)
+                )
+            name, template_name = match.groups()
+            statements = _split_statements(body)
+            if template_name:
+                if template_name not in templates:
+                    raise UnsupportedGradleConfiguration(
+                        'Unknown build type template "{}"'.format(template_name)
+                    )
+                statements = templates[template_name] + statements
+            statements_per_build_type.setdefault(name, []).extend(statements)
+
+    return [
+        {
+            "name": name,
+            # The debug build type is signed with the debug key by default
+            "signed": name == "debug"
+            or _has_signing_config(statements, local_properties),
+        }
+        for name, statements in statements_per_build_type.items()
+    ]
+
+
+def _parse_abi_splits(android_statements):
+    """Return the list of ABI filters, with ``None`` standing for a universal APK.
+
+    An empty list means ABI splits are disabled.
+    """
+    abis = []
+    for splits_body in _find_blocks(android_statements, "splits"):
+        for abi_body in _find_blocks(_split_statements(splits_body), "abi"):
+            enabled = False
+            universal = False
+            abi_filters = []
+            for header, body in _split_statements(abi_body):
+                words = header.split(None, 1)
+                if body is not None:
+                    raise UnsupportedGradleConfiguration(
+                        'Unexpected block in ABI splits: "{}"'.format(header)
+                    )
+                elif words[0] == "enable":
+                    enabled = words[1:] == ["true"]
+                elif words[0] == "universalApk":
+                    universal = words[1:] == ["true"]
+                elif header == "reset()":
+                    abi_filters = []
+                elif words[0] == "include":
+                    abi_filters.extend(_QUOTED_STRING.findall(words[1]))
+                else:
+                    raise UnsupportedGradleConfiguration(
+                        'Unexpected statement in ABI splits: "{}"'.format(header)
+                    )
+
+            if enabled:
+                abis = abi_filters + ([None] if universal else [])
+    return abis
+
+
+def _apk_file_name(build_type, abi, splits_enabled):
+    parts = ["app"]
+    if splits_enabled:
+        parts.append(abi or "universal")
+    parts.append(build_type["name"])
+    if not build_type["signed"]:
+        parts.append("unsigned")
+    return "{}.apk".format("-".join(parts))
+
+
+def resolve_variants(root_dir):
+    """Return the variants of the `app` project, in the shape of `./gradlew printVariants`"""
+    with open(os.path.join(root_dir, "app", "build.gradle")) as f:
+        script_statements = _split_statements(_strip_comments(f.read()))
+
+    android_statements = []
+    for android_body in _find_blocks(script_statements, "android"):
+        android_statements.extend(_split_statements(android_body))
+
+    if _find_blocks(android_statements, "productFlavors"):
+        raise UnsupportedGradleConfiguration("Product flavors are not supported")
+
+    build_types = _parse_build_types(
+        script_statements, android_statements, _read_local_properties(root_dir)
+    )
+    if not build_types:
+        raise UnsupportedGradleConfiguration("No build type found")
+
+    abis = _parse_abi_splits(android_statements)
+    splits_enabled = bool(abis)
+
+    variants = []
+    for build_type in build_types:
+        variants.append(
+            {
+                "apks": [
+                    {
+                        "abi": abi,
+                        "fileName": _apk_file_name(build_type, abi, splits_enabled),
+                    }
+                    for abi in abis or [None]
+                ],
+                "build_type": build_type["name"],
+                "name": build_type["name"],
+            }
+        )
+
+    # AndroidTest is a special case added by hand in `printVariants`
+    variants.append(
+        {
+            "apks": [
+                {
+                    "abi": "noarch",
+                    "fileName": "app-debug-androidTest.apk",
+                }
+            ],
+            "build_type": "androidTest",
+            "name": "androidTest",
+        }
+    )
+    return variants
+
+
+def _normalize_variants(variants):
+    return {
+        variant["name"]: dict(
+            variant,
+            apks=sorted(
+                variant["apks"], key=lambda apk: (apk["abi"] or "", apk["fileName"])
+            ),
+        )
+        for variant in variants
+    }
+
+
+def diff_variants(expected, actual):
+    """Return human-readable differences between two lists of variants"""
+    expected = _normalize_variants(expected)
+    actual = _normalize_variants(actual)
+
+    differences = []
+    for name in sorted(set(expected) | set(actual)):
+        if name not in actual:
+            differences.append('Variant "{}" is missing'.format(name))
+        elif name not in expected:
+            differences.append('Variant "{}" is unexpected'.format(name))
+        elif expected[name] != actual[name]:
+            differences.append(
+                'Variant "{}" differs: expected {}, got {}'.format(
+                    name, expected[name], actual[name]
+                )
+            )
+    return differences
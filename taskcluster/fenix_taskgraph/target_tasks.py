@@ -3,16 +3,17 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import os
-from redo import retry
 
 from taskgraph.target_tasks import _target_task
-from taskgraph.util.taskcluster import find_task_id
+
+from fenix_taskgraph.util.index import get_index_client
+from fenix_taskgraph.util.task_index import TRUTHY, get_task_graph_index
 
 
 def index_exists(index_path, reason=""):
     print(f"Looking for existing index {index_path} {reason}...")
     try:
-        task_id = find_task_id(index_path)
+        task_id = get_index_client().find_task_id(index_path)
         print(f"Index {index_path} exists: taskId {task_id}")
         return True
     except KeyError:
@@ -20,100 +21,72 @@ def index_exists(index_path, reason=""):
         return False
 
 
+def _query(full_task_graph, parameters, attributes):
+    """Return the labels of the tasks having the given attribute values.
+
+    See `TaskIndex.get_tasks()` for the accepted values.
+    """
+    index = get_task_graph_index(parameters, full_task_graph)
+    return [task.label for task in index.get_tasks(attributes=attributes)]
+
+
 @_target_task("promote")
 def target_tasks_promote(full_task_graph, parameters, graph_config):
-    def filter(task, parameters):
-        if (
-            task.attributes.get("release-type") == parameters["release_type"]
-            and task.attributes.get("shipping_phase") == "promote"
-        ):
-            return True
-
-    return [l for l, t in full_task_graph.tasks.items() if filter(t, parameters)]
+    return _query(
+        full_task_graph,
+        parameters,
+        {"release-type": parameters["release_type"], "shipping_phase": "promote"},
+    )
 
 
 @_target_task("ship")
 def target_tasks_ship(full_task_graph, parameters, graph_config):
-    filtered_for_candidates = target_tasks_promote(
+    # Include promotion tasks; these will be optimized out
+    return _query(
         full_task_graph,
         parameters,
-        graph_config,
+        {
+            "release-type": parameters["release_type"],
+            "shipping_phase": ["promote", "ship"],
+        },
     )
 
-    def filter(task, parameters):
-        # Include promotion tasks; these will be optimized out
-        if task.label in filtered_for_candidates:
-            return True
-
-        if (
-            task.attributes.get("release-type") == parameters["release_type"]
-            and task.attributes.get("shipping_phase") == "ship"
-        ):
-            return True
-
-    return [l for l, t in full_task_graph.tasks.items() if filter(t, parameters)]
-
 
 @_target_task("nightly")
 def target_tasks_nightly(full_task_graph, parameters, graph_config):
     """Select the set of tasks required for a nightly build."""
-
-    def filter(task, parameters):
-        return task.attributes.get("nightly", False)
-
     index_path = (
         f"{graph_config['trust-domain']}.v2.{parameters['project']}.branch."
         f"{parameters['head_ref']}.revision.{parameters['head_rev']}.taskgraph.decision-nightly"
     )
-    if os.environ.get("MOZ_AUTOMATION") and retry(
-        index_exists,
-        args=(index_path,),
-        kwargs={
-            "reason": "to avoid triggering multiple nightlies off the same revision",
-        },
+    if os.environ.get("MOZ_AUTOMATION") and index_exists(
+        index_path,
+        reason="to avoid triggering multiple nightlies off the same revision",
     ):
         return []
 
-    return [l for l, t in full_task_graph.tasks.items() if filter(t, parameters)]
+    return _query(full_task_graph, parameters, {"nightly": TRUTHY})
 
 
 @_target_task("nightly-test")
 def target_tasks_nightly_test(full_task_graph, parameters, graph_config):
     """Select the set of tasks required for a nightly build."""
-    def filter(task, parameters):
-        return task.attributes.get("nightly-test", False)
-    return [l for l, t in full_task_graph.tasks.items() if filter(t, parameters)]
-
-
-def _filter_fennec(fennec_type, task, parameters):
-    return task.attributes.get("build-type", "") == "fennec-{}".format(fennec_type)
+    return _query(full_task_graph, parameters, {"nightly-test": TRUTHY})
 
 
 @_target_task("fennec-production")
 def target_tasks_fennec_nightly(full_task_graph, parameters, graph_config):
     """Select the set of tasks required for a production build signed with the fennec key."""
-
-    return [
-        l
-        for l, t in full_task_graph.tasks.items()
-        if _filter_fennec("production", t, parameters)
-    ]
+    return _query(full_task_graph, parameters, {"build-type": "fennec-production"})
 
 
 @_target_task("screenshots")
 def target_tasks_screnshots(full_task_graph, parameters, graph_config):
     """Select the set of tasks required to generate screenshots on a real device."""
+    return _query(full_task_graph, parameters, {"screenshots": TRUTHY})
 
-    def filter(task, parameters):
-        return task.attributes.get("screenshots", False)
-
-    return [l for l, t in full_task_graph.tasks.items() if filter(t, parameters)]
 
 @_target_task("legacy_api_ui_tests")
 def target_tasks_legacy_api_ui_tests(full_task_graph, parameters, graph_config):
     """Select the set of tasks required to run select UI tests on other API."""
-
-    def filter(task, parameters):
-        return task.attributes.get("legacy", False)
-
-    return [l for l, t in full_task_graph.tasks.items() if filter(t, parameters)]
+    return _query(full_task_graph, parameters, {"legacy": TRUTHY})
@@ -8,15 +8,25 @@ kind.
 
 import copy
 import json
+import os
 
-from copy import deepcopy
 from taskgraph.transforms.base import TransformSequence
 from taskgraph.util.treeherder import inherit_treeherder_from_dep
 from taskgraph.util.schema import resolve_keyed_by
 
+from fenix_taskgraph.browsertime_durations import get_max_run_time, load_duration_model
+from fenix_taskgraph.util.task_index import get_kind_dependencies_index
+
 transforms = TransformSequence()
 
 
+def _get_duration_model(config):
+    model_path = config.config.get("duration-model")
+    if not model_path:
+        return {"tests": {}}
+    return load_duration_model(os.path.join(config.path, model_path))
+
+
 @transforms.add
 def split_raptor_subtests(config, tests):
     for test in tests:
@@ -27,16 +37,42 @@ def split_raptor_subtests(config, tests):
             yield test
             continue
 
+        # Subtests only override top-level keys of the test: they share the rest
+        # of it until add_variants() copies them.
         for subtest in subtests:
-            pageload_test = deepcopy(test)
-
             if isinstance(subtest, list):
-                pageload_test["test-name"] = subtest[0]
-                pageload_test["subtest-symbol"] = subtest[1]
+                test_name, subtest_symbol = subtest
             else:
-                pageload_test["test-name"] = subtest
-                pageload_test["subtest-symbol"] = subtest
-            yield pageload_test
+                test_name = subtest_symbol = subtest
+            yield dict(
+                test, **{"test-name": test_name, "subtest-symbol": subtest_symbol}
+            )
+
+
+def _instantiate_test(test, dep_task, abi, apk_path):
+    """Return a task of its own for `test` running against `dep_task`.
+
+    `test` and the attributes of `dep_task` are shared between all variants.
+    The task gets copies of them, down to nested values like `apks`, so it
+    can be modified without altering other tasks. `dep_task` itself must not
+    be modified.
+    """
+    task = copy.deepcopy(
+        {key: value for key, value in test.items() if key != "attributes"}
+    )
+    # Scalar attributes are immutable: only containers need copying
+    attributes = {
+        key: copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+        for key, value in dep_task.attributes.items()
+    }
+    # Tests aren't cached, even when the APK they run is
+    attributes.pop("cached_task", None)
+    attributes.update(copy.deepcopy(test.get("attributes", {})))
+    attributes["abi"] = abi
+    attributes["apk"] = apk_path
+    task["attributes"] = attributes
+    task["primary-dependency"] = dep_task
+    return task
 
 
 @transforms.add
@@ -46,24 +82,15 @@ def add_variants(config, tasks):
 
     tests = list(tasks)
 
-    for dep_task in config.kind_dependencies_tasks.values():
-        build_type = dep_task.attributes.get("build-type", "")
-        if build_type not in only_types:
-            continue
-
+    for dep_task in get_kind_dependencies_index(config).get_tasks(
+        attributes={"build-type": only_types}
+    ):
         for abi, apk_metadata in dep_task.attributes["apks"].items():
             if abi not in only_abis:
                 continue
             apk_path = apk_metadata["name"]
             for test in tests:
-                test = copy.deepcopy(test)
-                attributes = copy.deepcopy(dep_task.attributes)
-                attributes.update(test.get("attributes", {}))
-                attributes["abi"] = abi
-                attributes["apk"] = apk_path
-                test["attributes"] = attributes
-                test["primary-dependency"] = dep_task
-                yield test
+                yield _instantiate_test(test, dep_task, abi, apk_path)
 
 
 @transforms.add
@@ -112,6 +139,9 @@ def build_browsertime_task(config, tasks):
             }
         )
         task["run"]["command"].append("--test={}".format(test_name))
+        worker["max-run-time"] = get_max_run_time(
+            _get_duration_model(config), [test_name], worker["max-run-time"]
+        )
         task["run"]["command"].extend(task.pop("args", []))
 
         # Setup treherder symbol
@@ -134,7 +164,14 @@ def build_browsertime_task(config, tasks):
         run_visual_metrics = task.pop("run-visual-metrics", False)
         if run_visual_metrics:
             task["run"]["command"].append("--browsertime-video")
-            task["run"]["command"].append("--browsertime-visualmetrics")
+            if config.config.get("split-visual-metrics", False):
+                # Videos are only uploaded, the visual-metrics kind processes
+                # them without holding the device
+                task["attributes"][
+                    "visual-metrics-artifact"
+                ] = "browsertime-results.tgz"
+            else:
+                task["run"]["command"].append("--browsertime-visualmetrics")
             task["run"]["command"].append("--browsertime-no-ffwindowrecorder")
 
         # Build taskcluster group and symol
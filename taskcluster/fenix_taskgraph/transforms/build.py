@@ -6,8 +6,11 @@ Apply some defaults and minor modifications to the jobs defined in the build
 kind.
 """
 
+import copy
+
 from taskgraph.transforms.base import TransformSequence
-from fenix_taskgraph.gradle import get_variant
+from taskgraph.util.treeherder import add_suffix
+from fenix_taskgraph.gradle import get_variant_registry
 
 
 transforms = TransformSequence()
@@ -23,6 +26,38 @@ def add_variant_config(config, tasks):
         yield task
 
 
+@transforms.add
+def shard_by_abi(config, tasks):
+    """Split builds with `shard-by-abi` into one task per ABI of their variant.
+
+    Each shard only assembles the APK of its ABI. Downstream tasks group shards
+    back together by `build-type` (see `fenix_taskgraph.transforms.multi_dep`).
+    """
+    for task in tasks:
+        if not task.pop("shard-by-abi", False):
+            yield task
+            continue
+
+        variant = get_variant_registry().get_variant(task["run"]["gradle-build-type"])
+        abis = [apk["abi"] for apk in variant["apks"]]
+        # Universal APKs and builds without ABI splits can't be sharded
+        if len(abis) < 2 or any(abi in (None, "noarch") for abi in abis):
+            yield task
+            continue
+
+        for abi in abis:
+            shard = copy.deepcopy(task)
+            shard["name"] = "{}-{}".format(task["name"], abi)
+            shard["attributes"]["abi-shard"] = abi
+            shard["run"].setdefault("gradle-extra-options", []).append(
+                "-PabiFilter={}".format(abi)
+            )
+            shard["treeherder"]["symbol"] = add_suffix(
+                task["treeherder"]["symbol"], "-{}".format(abi)
+            )
+            yield shard
+
+
 @transforms.add
 def add_shippable_secrets(config, tasks):
     for task in tasks:
@@ -81,11 +116,10 @@ def add_shippable_secrets(config, tasks):
 def build_gradle_command(config, tasks):
     for task in tasks:
         gradle_build_type = task["run"]["gradle-build-type"]
-        variant_config = get_variant(gradle_build_type)
 
         task["run"]["gradlew"] = [
             "clean",
-            "assemble{}".format(variant_config["name"].capitalize()),
+            get_variant_registry().get_gradle_task("assemble", gradle_build_type),
         ]
 
         yield task
@@ -95,12 +129,11 @@ def build_gradle_command(config, tasks):
 def track_apk_size(config, tasks):
     for task in tasks:
         gradle_build_type = task["run"]["gradle-build-type"]
-        variant_config = get_variant(gradle_build_type)
 
         should_track_apk_size = task["run"].pop("track-apk-size", False)
         if should_track_apk_size:
             task["run"]["gradlew"].append(
-                "apkSize{}".format(variant_config["name"].capitalize())
+                get_variant_registry().get_gradle_task("apkSize", gradle_build_type)
             )
 
         yield task
@@ -160,33 +193,36 @@ def add_release_version(config, tasks):
 def add_artifacts(config, tasks):
     for task in tasks:
         gradle_build_type = task["run"].pop("gradle-build-type")
-        variant_config = get_variant(gradle_build_type)
         artifacts = task.setdefault("worker", {}).setdefault("artifacts", [])
-        task["attributes"]["apks"] = apks = {}
+        task["attributes"]["apks"] = {}
 
         if "apk-artifact-template" in task:
             artifact_template = task.pop("apk-artifact-template")
-            for apk in variant_config["apks"]:
-                apk_name = artifact_template["name"].format(**apk)
-                artifacts.append(
-                    {
-                        "type": artifact_template["type"],
-                        "name": apk_name,
-                        "path": artifact_template["path"].format(
-                            gradle_build_type=gradle_build_type, **apk
-                        ),
-                    }
-                )
-                apks[apk["abi"]] = {
-                    "name": apk_name,
-                    "github-name": artifact_template["github-name"].format(
-                        version=config.params["version"], **apk
-                    ),
-                }
+            apk_artifacts, apks = get_variant_registry().get_apk_artifacts(
+                gradle_build_type, artifact_template, config.params["version"]
+            )
+            abi_shard = task["attributes"].get("abi-shard")
+            if abi_shard:
+                apks = {abi_shard: apks[abi_shard]}
+                apk_artifacts = [
+                    artifact
+                    for artifact in apk_artifacts
+                    if artifact["name"] == apks[abi_shard]["name"]
+                ]
+            artifacts.extend(apk_artifacts)
+            task["attributes"]["apks"] = apks
 
         yield task
 
 
+@transforms.add
+def add_cache_resources(config, tasks):
+    for task in tasks:
+        if task.pop("cached", False):
+            task["run"]["resources"] = list(config.config["cache-resources"])
+        yield task
+
+
 @transforms.add
 def filter_incomplete_translation(config, tasks):
     for task in tasks:
@@ -23,11 +23,19 @@ def build_name_and_attributes(config, tasks):
         }
         primary_dep = task["primary-dependency"]
         attributes = primary_dep.attributes.copy()
+        # Whether the task is cached is up to its own kind
+        attributes.pop("cached_task", None)
+        task["name"] = _get_dependent_job_name_without_its_kind(primary_dep)
+        abi_shard = attributes.pop("abi-shard", None)
+        if abi_shard:
+            # Shards are merged back into a single task, the same as the one
+            # depending on an unsharded build
+            task["name"] = task["name"][: -len(abi_shard) - 1]
+            attributes["apks"] = _merge_shard_apks(task, primary_dep.kind)
         attributes.update(task.get("attributes", {}))
         task["attributes"] = attributes
         # run_on_tasks_for is set as an attribute later in the pipeline
         task.setdefault("run-on-tasks-for", attributes["run_on_tasks_for"])
-        task["name"] = _get_dependent_job_name_without_its_kind(primary_dep)
 
         yield task
 
@@ -36,6 +44,19 @@ def _get_dependent_job_name_without_its_kind(dependent_job):
     return dependent_job.label[len(dependent_job.kind) + 1 :]
 
 
+def _merge_shard_apks(task, kind):
+    apks = {}
+    for dep in _get_all_deps(task).values():
+        if dep.kind == kind:
+            apks.update(
+                {
+                    abi: dict(apk)
+                    for abi, apk in dep.attributes.get("apks", {}).items()
+                }
+            )
+    return apks
+
+
 def _get_all_deps(task):
     if task.get("dependent-tasks"):
         return task["dependent-tasks"]
@@ -73,7 +94,7 @@ def build_upstream_artifacts(config, tasks):
                 "upstream-artifacts"
             ] = generate_beetmover_upstream_artifacts(config, task, build_type, locale)
         else:
-            for dep in _get_all_deps(task).values():
+            for dep_key, dep in _get_all_deps(task).items():
                 paths = sorted(
                     [
                         apk_metadata["name"]
@@ -83,7 +104,7 @@ def build_upstream_artifacts(config, tasks):
                 if paths:
                     worker_definition["upstream-artifacts"].append(
                         {
-                            "taskId": {"task-reference": "<{}>".format(dep.kind)},
+                            "taskId": {"task-reference": "<{}>".format(dep_key)},
                             "taskType": dep.kind,
                             "paths": paths,
                         }
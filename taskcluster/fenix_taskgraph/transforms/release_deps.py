@@ -7,6 +7,8 @@ Add dependencies to release tasks.
 
 from taskgraph.transforms.base import TransformSequence
 
+from fenix_taskgraph.util.task_index import get_kind_dependencies_index
+
 PHASES = ["build", "promote", "push", "ship"]
 
 transforms = TransformSequence()
@@ -22,7 +24,10 @@ def add_dependencies(config, tasks):
         if release_type is None:
             continue
 
-        for dep_task in config.kind_dependencies_tasks.values():
+        # Add matching release_type tasks to deps
+        for dep_task in get_kind_dependencies_index(config).get_tasks(
+            attributes={"release-type": release_type}
+        ):
             # Weed out unwanted tasks.
             # XXX we have run-on-projects which specifies the on-push behavior;
             # we need another attribute that specifies release promotion,
@@ -33,12 +38,7 @@ def add_dependencies(config, tasks):
             if dep_phase and PHASES.index(dep_phase) > PHASES.index(phase):
                 continue
 
-            # Add matching release_type tasks to deps
-            if (
-                dep_task.task.get("release-type") == release_type
-                or dep_task.attributes.get("release-type") == release_type
-            ):
-                dependencies[dep_task.label] = dep_task.label
+            dependencies[dep_task.label] = dep_task.label
 
         task.setdefault("dependencies", {}).update(dependencies)
 
@@ -6,6 +6,9 @@ Apply some defaults and minor modifications to the jobs defined in the build
 kind.
 """
 
+import json
+
+import taskgraph
 from taskgraph.transforms.base import TransformSequence
 from taskgraph.util.schema import resolve_keyed_by
 
@@ -113,3 +116,31 @@ def format_email(config, tasks):
                 email["content"] = email["content"].format(version=version)
 
         yield task
+
+
+@transforms.add
+def add_cache(config, tasks):
+    """Cache the signing tasks of cached builds.
+
+    They're only run again when the APKs they sign or how they sign them change.
+    """
+    for task in tasks:
+        # Cached tasks are ordered by label, which the task transforms would set
+        # the same way
+        task.setdefault("label", "{}-{}".format(config.kind, task["name"]))
+        dependencies = [
+            config.kind_dependencies_tasks[label]
+            for label in task["dependencies"].values()
+        ]
+        if not taskgraph.fast and all(
+            "cached_task" in dependency.attributes for dependency in dependencies
+        ):
+            task["cache"] = {
+                "type": "signing.v1",
+                "name": task["name"],
+                "digest-data": [
+                    task["worker-type"],
+                    json.dumps(task["worker"], sort_keys=True),
+                ],
+            }
+        yield task
@@ -0,0 +1,40 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Compute the visual metrics of browsertime tasks, off the device they ran on.
+"""
+
+from taskgraph.transforms.base import TransformSequence
+from taskgraph.util.treeherder import inherit_treeherder_from_dep, join_symbol
+
+
+transforms = TransformSequence()
+
+
+@transforms.add
+def build_visual_metrics_task(config, tasks):
+    for task in tasks:
+        del task["dependent-tasks"]
+        dep = task.pop("primary-dependency")
+
+        attributes = dep.attributes.copy()
+        artifact = attributes.pop("visual-metrics-artifact")
+        attributes.update(task.get("attributes", {}))
+        task["attributes"] = attributes
+        task.setdefault("run-on-tasks-for", attributes["run_on_tasks_for"])
+
+        task["name"] = dep.label[len(dep.kind) + 1 :]
+        task["dependencies"] = {"browsertime": dep.label}
+        task.setdefault("fetches", {})["browsertime"] = [
+            {"artifact": artifact, "extract": False}
+        ]
+
+        task["treeherder"] = inherit_treeherder_from_dep(task, dep)
+        dep_treeherder = dep.task["extra"]["treeherder"]
+        task["treeherder"]["symbol"] = join_symbol(
+            dep_treeherder.get("groupSymbol", "?"),
+            "{}-vm".format(dep_treeherder["symbol"]),
+        )
+
+        yield task
@@ -0,0 +1,194 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Persistent, content-addressed caches for expensive decision-time lookups.
+
+Entries are JSON files stored under ``$FENIX_TASKGRAPH_CACHE_DIR`` (defaults to
+the user cache directory) and grouped by namespace. Keys are expected to be
+digests of whatever inputs produced the value, so entries never need to be
+updated in place: a change in the inputs yields a new key. Caches of values
+which change over time, e.g. the results of remote lookups, are given a `ttl`
+instead: their entries expire that many seconds after they're written.
+
+Caches can be inspected and invalidated from the ``taskcluster`` directory with::
+
+    python3 -m fenix_taskgraph.util.cache list
+    python3 -m fenix_taskgraph.util.cache clear [namespace ...]
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import appdirs
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_cache_root():
+    return os.environ.get(
+        "FENIX_TASKGRAPH_CACHE_DIR",
+        os.path.join(appdirs.user_cache_dir("taskgraph"), "fenix"),
+    )
+
+
+def is_cache_disabled():
+    return os.environ.get("FENIX_TASKGRAPH_NO_CACHE", "") not in ("", "0")
+
+
+class DiskCache:
+    def __init__(self, namespace, root=None, ttl=None):
+        self.namespace = namespace
+        self.path = os.path.join(root or get_cache_root(), namespace)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, "{}.json".format(key))
+
+    def _open(self, key):
+        entry_path = self._entry_path(key)
+        if (
+            self.ttl is not None
+            and time.time() - os.path.getmtime(entry_path) > self.ttl
+        ):
+            return None
+        return open(entry_path)
+
+    def _read(self, key):
+        try:
+            f = self._open(key)
+            if f is None:
+                return None
+            with f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, key):
+        """Return the cached value for ``key``, or ``None`` on a miss."""
+        if is_cache_disabled():
+            self.misses += 1
+            return None
+
+        value = self._read(key)
+        if value is None:
+            self.misses += 1
+            logger.info("{} cache miss: {}".format(self.namespace, key))
+            return None
+
+        self.hits += 1
+        logger.info("{} cache hit: {}".format(self.namespace, key))
+        return value
+
+    def open(self, key):
+        """Return the cached JSON of ``key`` as a text file, or ``None`` on a miss.
+
+        Lets large values be parsed incrementally instead of loaded at once.
+        """
+        if is_cache_disabled():
+            self.misses += 1
+            return None
+
+        try:
+            f = self._open(key)
+        except OSError:
+            f = None
+        if f is None:
+            self.misses += 1
+            logger.info("{} cache miss: {}".format(self.namespace, key))
+            return None
+
+        self.hits += 1
+        logger.info("{} cache hit: {}".format(self.namespace, key))
+        return f
+
+    def _write(self, key, write, mode="w"):
+        os.makedirs(self.path, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a
+        # partially written entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode) as f:
+                write(f)
+            os.replace(tmp_path, self._entry_path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def put(self, key, value):
+        if is_cache_disabled():
+            return
+
+        self._write(key, lambda f: json.dump(value, f, sort_keys=True))
+
+    def put_file(self, key, fileobj):
+        """Cache the JSON read from the binary file ``fileobj`` under ``key``."""
+        if is_cache_disabled():
+            return
+
+        self._write(key, lambda f: shutil.copyfileobj(fileobj, f), mode="wb")
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def keys(self):
+        try:
+            file_names = os.listdir(self.path)
+        except OSError:
+            return []
+        return sorted(
+            file_name[: -len(".json")]
+            for file_name in file_names
+            if file_name.endswith(".json")
+        )
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def _list_namespaces(root):
+    try:
+        return sorted(
+            name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name))
+        )
+    except OSError:
+        return []
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Inspect or invalidate the fenix-taskgraph on-disk caches."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="list cache namespaces and their entries")
+    clear_parser = subparsers.add_parser(
+        "clear", help="delete cache entries (all namespaces by default)"
+    )
+    clear_parser.add_argument("namespaces", nargs="*", help="namespaces to clear")
+
+    result = parser.parse_args()
+    root = get_cache_root()
+
+    if result.command == "list":
+        print("Cache root: {}".format(root))
+        for namespace in _list_namespaces(root):
+            keys = DiskCache(namespace, root).keys()
+            print("{}: {} entries".format(namespace, len(keys)))
+            for key in keys:
+                print("    {}".format(key))
+    elif result.command == "clear":
+        for namespace in result.namespaces or _list_namespaces(root):
+            DiskCache(namespace, root).clear()
+            print("Cleared {} cache".format(namespace))
+
+
+if __name__ == "__main__":
+    main()
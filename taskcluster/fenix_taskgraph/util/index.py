@@ -0,0 +1,258 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Client of the Taskcluster index, to look many index paths up at once.
+
+Paths are looked up in batches with the `findTasksAtIndex` endpoint, batches
+being sent concurrently over a pooled session. Deployments which don't have
+that endpoint are queried one path at a time, also concurrently. Failed
+requests are retried with an exponential backoff.
+
+Found tasks are cached on disk for `ttl` seconds (see
+`fenix_taskgraph.util.cache`), so that repeated local runs don't query the index
+again. Paths without a task aren't cached: a task may be indexed there any time,
+and callers like the nightly target tasks rely on seeing it. Point
+`TASKCLUSTER_ROOT_URL` at `fenix_taskgraph.index_server` to use a local
+stand-in of the index. Paths can be looked up from the `taskcluster`
+directory with::
+
+    python3 -m fenix_taskgraph.util.index <index path>...
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from redo import retry
+from requests.adapters import HTTPAdapter
+from taskcluster_urls import api
+from taskgraph.util.memoize import memoize
+from taskgraph.util.taskcluster import get_root_url
+
+from fenix_taskgraph.util.cache import DiskCache
+
+
+logger = logging.getLogger(__name__)
+
+# Most index paths the index returns tasks of in a single request
+BATCH_SIZE = 1000
+DEFAULT_TTL = 600
+DEFAULT_JOBS = 8
+
+
+class TransientError(Exception):
+    """A request failed in a way which may not happen again"""
+
+
+class IndexClient:
+    def __init__(
+        self,
+        root_url=None,
+        ttl=DEFAULT_TTL,
+        jobs=DEFAULT_JOBS,
+        batch_size=BATCH_SIZE,
+        attempts=5,
+        sleeptime=1,
+    ):
+        self.root_url = root_url or get_root_url(False)
+        # Keep entries of different deployments, e.g. of a local stand-in, apart
+        self.cache = (
+            DiskCache("index-{}".format(_digest(self.root_url)[:12]), ttl=ttl)
+            if ttl
+            else None
+        )
+        self.jobs = jobs
+        self.batch_size = batch_size
+        self.attempts = attempts
+        self.sleeptime = sleeptime
+        self.request_count = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=jobs)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._batch_endpoint_missing = False
+
+    def _url(self, path):
+        return api(self.root_url, "index", "v1", path)
+
+    def _request(self, method, url, **kwargs):
+        self.request_count += 1
+        try:
+            response = self.session.request(method, url, timeout=30, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as error:
+            raise TransientError(str(error))
+        if response.status_code >= 500 or response.status_code == 429:
+            raise TransientError(
+                "{} {} returned {}".format(method.upper(), url, response.status_code)
+            )
+        return response
+
+    def _request_with_backoff(self, method, url, **kwargs):
+        return retry(
+            self._request,
+            attempts=self.attempts,
+            sleeptime=self.sleeptime,
+            max_sleeptime=30,
+            sleepscale=2,
+            jitter=self.sleeptime / 2,
+            retry_exceptions=(TransientError,),
+            args=(method, url),
+            kwargs=kwargs,
+            log_args=False,
+        )
+
+    def _find_one(self, index_path):
+        response = self._request_with_backoff(
+            "get", self._url("task/{}".format(index_path))
+        )
+        if response.status_code == 404:
+            return {}
+        response.raise_for_status()
+        return {index_path: response.json()["taskId"]}
+
+    def _find_batch(self, index_paths):
+        task_ids = {}
+        query = {}
+        while True:
+            response = self._request_with_backoff(
+                "post",
+                self._url("tasks/indexes"),
+                json={"indexes": index_paths},
+                params=query,
+            )
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            data = response.json()
+            for task in data["tasks"]:
+                task_ids[task["namespace"]] = task["taskId"]
+            if not data.get("continuationToken"):
+                return task_ids
+            query = {"continuationToken": data["continuationToken"]}
+
+    def _find(self, executor, index_paths):
+        if not self._batch_endpoint_missing:
+            batches = [
+                index_paths[start : start + self.batch_size]
+                for start in range(0, len(index_paths), self.batch_size)
+            ]
+            task_ids = {}
+            for batch_task_ids in executor.map(self._find_batch, batches):
+                if batch_task_ids is None:
+                    logger.info("The index can't look paths up in batches")
+                    self._batch_endpoint_missing = True
+                    break
+                task_ids.update(batch_task_ids)
+            else:
+                return task_ids
+
+        task_ids = {}
+        for path_task_ids in executor.map(self._find_one, index_paths):
+            task_ids.update(path_task_ids)
+        return task_ids
+
+    def find_task_ids(self, index_paths):
+        """Return the id of the task indexed at each path, or None if there's none"""
+        task_ids = {}
+        missing = []
+        for index_path in dict.fromkeys(index_paths):
+            entry = self.cache.get(_digest(index_path)) if self.cache else None
+            if entry is None or entry["taskId"] is None:
+                missing.append(index_path)
+            else:
+                task_ids[index_path] = entry["taskId"]
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                found = self._find(executor, missing)
+            for index_path in missing:
+                task_ids[index_path] = found.get(index_path)
+                if self.cache and task_ids[index_path] is not None:
+                    self.cache.put(
+                        _digest(index_path),
+                        {"indexPath": index_path, "taskId": task_ids[index_path]},
+                    )
+
+        return {index_path: task_ids[index_path] for index_path in index_paths}
+
+    def find_task_id(self, index_path):
+        """Return the id of the task indexed at `index_path`.
+
+        Raises KeyError when there's none, like `taskgraph.util.taskcluster`.
+        """
+        task_id = self.find_task_ids([index_path])[index_path]
+        if task_id is None:
+            raise KeyError("index path {} not found".format(index_path))
+        return task_id
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+@memoize
+def get_index_client():
+    return IndexClient()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look index paths up.")
+    parser.add_argument(
+        "index_paths", nargs="+", metavar="index-path", help="index path to look up"
+    )
+    parser.add_argument(
+        "--root-url", help="root URL of the Taskcluster deployment to query"
+    )
+    parser.add_argument(
+        "--ttl",
+        type=int,
+        default=DEFAULT_TTL,
+        help="seconds to cache results for, 0 to disable the cache "
+        "(default: {})".format(DEFAULT_TTL),
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help="number of concurrent requests (default: {})".format(DEFAULT_JOBS),
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=BATCH_SIZE,
+        help="index paths per request (default: {})".format(BATCH_SIZE),
+    )
+
+    result = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    client = IndexClient(
+        root_url=result.root_url,
+        ttl=result.ttl,
+        jobs=result.jobs,
+        batch_size=result.batch_size,
+    )
+    start = time.monotonic()
+    task_ids = client.find_task_ids(result.index_paths)
+    elapsed = time.monotonic() - start
+
+    print(json.dumps(task_ids, indent=2, sort_keys=True))
+    print(
+        "Found {} of {} index paths in {:.3f}s with {} requests".format(
+            sum(task_id is not None for task_id in task_ids.values()),
+            len(task_ids),
+            elapsed,
+            client.request_count,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
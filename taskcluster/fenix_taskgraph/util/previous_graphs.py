@@ -0,0 +1,196 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Loading of the graphs of previous decision and action tasks.
+
+Artifacts are downloaded concurrently and merged as they arrive. The artifacts
+of a finished task never change, so they're cached on disk by task id (see
+`fenix_taskgraph.util.cache`).
+
+Full task graphs are streamed: tasks are decoded one at a time and only the
+labels of the kinds that are reused are kept, instead of deserializing whole
+graphs into `Task` objects.
+"""
+
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from taskgraph.util.taskcluster import get_artifact, get_artifact_url, get_session
+
+from fenix_taskgraph.util.cache import DiskCache
+
+
+logger = logging.getLogger(__name__)
+
+FULL_TASK_GRAPH_ARTIFACT = "public/full-task-graph.json"
+LABEL_TO_TASKID_ARTIFACT = "public/label-to-taskid.json"
+DEFAULT_JOBS = 8
+CHUNK_SIZE = 64 * 1024
+# Characters which may follow a value of a JSON object
+DELIMITERS = frozenset(" \t\n\r,:}")
+
+full_task_graphs_cache = DiskCache("full-task-graphs")
+label_to_taskids_cache = DiskCache("label-to-taskids")
+
+
+def _open_full_task_graph(graph_id):
+    """Return the JSON full task graph of the task `graph_id` as a text file."""
+    f = full_task_graphs_cache.open(graph_id)
+    if f is not None:
+        return f
+
+    response = get_session().get(
+        get_artifact_url(graph_id, FULL_TASK_GRAPH_ARTIFACT), stream=True
+    )
+    response.raise_for_status()
+    response.raw.decode_content = True
+    full_task_graphs_cache.put_file(graph_id, response.raw)
+    f = full_task_graphs_cache.open(graph_id)
+    if f is None:
+        # The cache is disabled: read the graph as it's downloaded
+        return io.TextIOWrapper(response.raw, encoding="utf-8")
+    return f
+
+
+class _JSONStream:
+    """Decoder of JSON values from a text file, reading it as needed."""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def _read(self):
+        self.buffer = self.buffer[self.position :]
+        self.position = 0
+        chunk = self.f.read(self.chunk_size)
+        self.eof = not chunk
+        self.buffer += chunk
+
+    def peek(self):
+        """Return the next non-whitespace character, or "" at the end of the file"""
+        while True:
+            while (
+                self.position < len(self.buffer)
+                and self.buffer[self.position].isspace()
+            ):
+                self.position += 1
+            if self.position < len(self.buffer) or self.eof:
+                return self.buffer[self.position : self.position + 1]
+            self._read()
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(
+                "Expected one of {!r}, got {!r}".format(
+                    characters, self.buffer[self.position : self.position + 20]
+                )
+            )
+        self.position += 1
+        return character
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A value not followed by a delimiter could be a truncated number
+                if self.eof or (
+                    end < len(self.buffer) and self.buffer[end] in DELIMITERS
+                ):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read()
+
+
+def iter_json_object(f, chunk_size=CHUNK_SIZE):
+    """Yield the keys and values of the JSON object read from the text file `f`.
+
+    Values are decoded one at a time, so only the ones the caller keeps stay in
+    memory.
+    """
+    stream = _JSONStream(f, chunk_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.decode()
+        stream.expect(":")
+        yield key, stream.decode()
+        if stream.expect(",}") == "}":
+            return
+
+
+def get_reused_labels(graph_id, rebuild_kinds):
+    """Return the labels of the tasks of the full task graph of `graph_id` which
+    aren't of `rebuild_kinds`."""
+    labels = set()
+    with _open_full_task_graph(graph_id) as f:
+        for label, task in iter_json_object(f):
+            if task["attributes"]["kind"] not in rebuild_kinds:
+                labels.add(label)
+    return labels
+
+
+def get_label_to_taskid(graph_id):
+    label_to_taskid = label_to_taskids_cache.get(graph_id)
+    if label_to_taskid is None:
+        label_to_taskid = get_artifact(graph_id, LABEL_TO_TASKID_ARTIFACT)
+        label_to_taskids_cache.put(graph_id, label_to_taskid)
+    return label_to_taskid
+
+
+def find_existing_tasks_from_previous_kinds(
+    previous_graph_ids, rebuild_kinds, jobs=DEFAULT_JOBS
+):
+    """Return the ids of the tasks of the previous graphs to reuse.
+
+    Like `taskgraph.util.taskgraph.find_existing_tasks_from_previous_kinds`,
+    tasks of the previous full task graphs that aren't of `rebuild_kinds` are
+    reused. The rightmost graph which has a task takes precedence, whatever
+    order the artifacts are downloaded in.
+    """
+    # A graph given several times counts at its last position
+    positions = {
+        graph_id: position for position, graph_id in enumerate(previous_graph_ids)
+    }
+    rebuild_kinds = set(rebuild_kinds)
+    reused_labels = set()
+    existing_tasks = {}
+    task_positions = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        labels_futures = {
+            executor.submit(get_reused_labels, graph_id, rebuild_kinds): graph_id
+            for graph_id in positions
+        }
+        task_ids_futures = {
+            executor.submit(get_label_to_taskid, graph_id): graph_id
+            for graph_id in positions
+        }
+
+        for future in as_completed([*labels_futures, *task_ids_futures]):
+            if future in labels_futures:
+                reused_labels.update(future.result())
+                continue
+
+            position = positions[task_ids_futures[future]]
+            for label, task_id in future.result().items():
+                if task_positions.get(label, -1) < position:
+                    existing_tasks[label] = task_id
+                    task_positions[label] = position
+
+    return {
+        label: task_id
+        for label, task_id in existing_tasks.items()
+        if label in reused_labels
+    }
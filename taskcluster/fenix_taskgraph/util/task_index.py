@@ -0,0 +1,154 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Index of tasks by kind and by the attributes fenix loaders, transforms and
+target task methods filter on, so they can look tasks up instead of scanning
+all of them.
+"""
+
+import weakref
+
+INDEXED_ATTRIBUTES = ("build-type", "release-type", "shipping_phase")
+TARGET_ATTRIBUTES = INDEXED_ATTRIBUTES + (
+    "legacy",
+    "nightly",
+    "nightly-test",
+    "screenshots",
+)
+
+# Attribute value matching any truthy value, like `task.attributes.get(...)`
+TRUTHY = object()
+
+
+class TaskIndex:
+    def __init__(self, tasks=(), attributes=INDEXED_ATTRIBUTES):
+        self._tasks = []
+        self._positions = {}
+        self._tasks_per_kind = {}
+        self._tasks_per_attribute = {attribute: {} for attribute in attributes}
+        self.extend(tasks)
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def extend(self, tasks):
+        for task in tasks:
+            self._positions[id(task)] = len(self._tasks)
+            self._tasks.append(task)
+            self._tasks_per_kind.setdefault(task.kind, []).append(task)
+            for attribute, tasks_per_value in self._tasks_per_attribute.items():
+                value = task.attributes.get(attribute)
+                try:
+                    tasks_per_value.setdefault(value, []).append(task)
+                except TypeError:
+                    # Unhashable values can't be looked up
+                    pass
+
+    def _union(self, candidate_lists):
+        if len(candidate_lists) == 1:
+            return list(candidate_lists[0])
+        tasks = {id(task): task for tasks in candidate_lists for task in tasks}
+        return sorted(tasks.values(), key=lambda task: self._positions[id(task)])
+
+    def get_tasks(self, kinds=None, attributes=None):
+        """Return tasks in load order, filtered by kind and by attribute values.
+
+        `kinds` is a collection of kind names. `attributes` maps each indexed
+        attribute to a value or a list of accepted values. `None` matches tasks
+        without that attribute, `TRUTHY` the ones where it's truthy.
+        """
+        candidate_sets = []
+        if kinds is not None:
+            candidate_sets.append(
+                self._union([self._tasks_per_kind.get(kind, []) for kind in kinds])
+            )
+        for attribute, values in (attributes or {}).items():
+            if values is TRUTHY:
+                values = [
+                    value for value in self._tasks_per_attribute[attribute] if value
+                ]
+            elif not isinstance(values, (list, tuple, set, frozenset)):
+                values = [values]
+            candidate_sets.append(
+                self._union(
+                    [
+                        self._tasks_per_attribute[attribute].get(value, [])
+                        for value in values
+                    ]
+                )
+            )
+
+        if not candidate_sets:
+            return list(self._tasks)
+
+        candidate_sets.sort(key=len)
+        tasks = candidate_sets[0]
+        for other_tasks in candidate_sets[1:]:
+            other_ids = {id(task) for task in other_tasks}
+            tasks = [task for task in tasks if id(task) in other_ids]
+        return tasks
+
+
+# Indexes of each graph generation, by the id of its parameters
+_generation_indexes = {}
+
+
+def _get_generation_indexes(parameters):
+    """Return the indexes of the graph generation using `parameters`.
+
+    They're dropped along with the parameters, so a later generation in the
+    same process, even one reusing their id, never gets them.
+    """
+    key = id(parameters)
+    entry = _generation_indexes.get(key)
+    if entry is None or entry[0]() is not parameters:
+
+        def drop(reference):
+            if _generation_indexes.get(key, (None,))[0] is reference:
+                del _generation_indexes[key]
+
+        entry = _generation_indexes[key] = (weakref.ref(parameters, drop), {})
+    return entry[1]
+
+
+def get_loaded_tasks_index(parameters, loaded_tasks):
+    """Return the index of the tasks loaded so far in the graph generation.
+
+    Each kind is given the tasks of the previous kinds in load order, followed
+    by the ones just loaded. The index of the generation is therefore only
+    extended with the new tasks.
+    """
+    indexes = _get_generation_indexes(parameters)
+    index = indexes.setdefault("loaded-tasks", TaskIndex())
+    if len(loaded_tasks) < len(index):
+        # Not loaded by the generator, e.g. `load_tasks_for_kind()`
+        index = indexes["loaded-tasks"] = TaskIndex()
+    index.extend(loaded_tasks[len(index) :])
+    return index
+
+
+def get_kind_dependencies_index(config):
+    """Return the index of `config.kind_dependencies_tasks`.
+
+    It's built once per kind and shared by all of its transforms.
+    """
+    indexes = _get_generation_indexes(config.params)
+    kind_dependencies_tasks, index = indexes.get("kind-dependencies", (None, None))
+    if kind_dependencies_tasks is not config.kind_dependencies_tasks:
+        index = TaskIndex(config.kind_dependencies_tasks.values())
+        indexes["kind-dependencies"] = (config.kind_dependencies_tasks, index)
+    return index
+
+
+def get_task_graph_index(parameters, task_graph):
+    """Return the index of the tasks of `task_graph` by `TARGET_ATTRIBUTES`.
+
+    It's built once per graph and shared by all target task methods.
+    """
+    indexes = _get_generation_indexes(parameters)
+    indexed_graph, index = indexes.get("task-graph", (None, None))
+    if indexed_graph is not task_graph:
+        index = TaskIndex(task_graph.tasks.values(), TARGET_ATTRIBUTES)
+        indexes["task-graph"] = (task_graph, index)
+    return index
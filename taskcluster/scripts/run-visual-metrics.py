@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Compute the visual metrics of the videos recorded by a browsertime task.
+
+Videos are analyzed in parallel by browsertime's visualmetrics-portable.py. The
+metrics of each page-load test are reported to Perfherder as a suite of their
+own, and written to perfherder-data.json.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+
+FETCHES_DIR = os.environ.get("MOZ_FETCHES_DIR", "fetches")
+VISUAL_METRICS_OPTIONS = [
+    "--orange",
+    "--perceptual",
+    "--contentful",
+    "--force",
+    "--renderignore",
+    "5",
+    "--json",
+    "--viewport",
+]
+
+
+def find_videos(results_dir):
+    """Yield the test name and path of every video found in the browsertime results"""
+    for dir_path, _, file_names in sorted(os.walk(results_dir)):
+        if "browsertime.json" not in file_names:
+            continue
+
+        with open(os.path.join(dir_path, "browsertime.json")) as f:
+            results = json.load(f)
+        # Raptor stores the results of each test in a directory named after it
+        test_name = os.path.basename(dir_path)
+        for result in results:
+            for video in result.get("files", {}).get("video", []):
+                yield test_name, os.path.join(dir_path, video)
+
+
+def compute_visual_metrics(visualmetrics_path, video_path):
+    output = subprocess.check_output(
+        [sys.executable, visualmetrics_path, "--video", video_path]
+        + VISUAL_METRICS_OPTIONS
+    )
+    return json.loads(output)
+
+
+def build_perfherder_data(metrics_per_test):
+    suites = []
+    for test_name, metrics in sorted(metrics_per_test.items()):
+        suites.append(
+            {
+                "name": test_name,
+                "type": "pageload",
+                "extraOptions": ["visual-metrics"],
+                "lowerIsBetter": True,
+                "unit": "ms",
+                "shouldAlert": False,
+                "subtests": [
+                    {
+                        "name": metric,
+                        "value": statistics.median(values),
+                        "replicates": values,
+                        "lowerIsBetter": True,
+                        "unit": "ms",
+                        "shouldAlert": False,
+                    }
+                    for metric, values in sorted(metrics.items())
+                ],
+            }
+        )
+    return {"framework": {"name": "browsertime"}, "suites": suites}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute the visual metrics of browsertime videos"
+    )
+    parser.add_argument(
+        "--browsertime-results",
+        default=os.path.join(FETCHES_DIR, "browsertime-results.tgz"),
+        help="browsertime-results.tgz uploaded by the browsertime task",
+    )
+    parser.add_argument(
+        "--visualmetrics",
+        default=os.path.join(
+            FETCHES_DIR,
+            "browsertime",
+            "node_modules",
+            "browsertime",
+            "browsertime",
+            "visualmetrics-portable.py",
+        ),
+        help="path to browsertime's visualmetrics-portable.py",
+    )
+    parser.add_argument(
+        "--ffmpeg-dir",
+        default=os.path.join(FETCHES_DIR, "ffmpeg-4.1.4-i686-static", "bin"),
+        help="directory containing the ffmpeg binary",
+    )
+    parser.add_argument(
+        "--output-dir", required=True, help="directory to write perfherder-data.json to"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, help="number of processes (default: CPU count)"
+    )
+    result = parser.parse_args()
+
+    # visualmetrics-portable.py looks ffmpeg up in the PATH
+    os.environ["PATH"] = os.pathsep.join(
+        [os.path.abspath(result.ffmpeg_dir), os.environ.get("PATH", "")]
+    )
+
+    metrics_per_test = {}
+    failures = 0
+    with tempfile.TemporaryDirectory() as results_dir:
+        with tarfile.open(result.browsertime_results) as tar:
+            tar.extractall(results_dir)
+
+        videos = list(find_videos(results_dir))
+        print("Computing visual metrics of {} videos".format(len(videos)))
+        with ProcessPoolExecutor(max_workers=result.jobs) as executor:
+            futures = [
+                executor.submit(compute_visual_metrics, result.visualmetrics, video)
+                for _, video in videos
+            ]
+            for (test_name, video), future in zip(videos, futures):
+                try:
+                    visual_metrics = future.result()
+                except (subprocess.CalledProcessError, ValueError) as error:
+                    print("Failed to process {}: {}".format(video, error))
+                    failures += 1
+                    continue
+
+                metrics = metrics_per_test.setdefault(test_name, {})
+                for metric, value in visual_metrics.items():
+                    # Skip progress strings, e.g. "VisualProgress"
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        metrics.setdefault(metric, []).append(value)
+
+    perfherder_data = build_perfherder_data(metrics_per_test)
+    os.makedirs(result.output_dir, exist_ok=True)
+    with open(os.path.join(result.output_dir, "perfherder-data.json"), "w") as f:
+        json.dump(perfherder_data, f, indent=2, sort_keys=True)
+    print("PERFHERDER_DATA: {}".format(json.dumps(perfherder_data, sort_keys=True)))
+
+    if failures:
+        print("{} of {} videos couldn't be processed".format(failures, len(videos)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
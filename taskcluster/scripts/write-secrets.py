@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Write the secrets of a task to files, from a JSON manifest.
+
+Each entry of the manifest has the `path` of the file to write, relative to the
+root of the repository, and either the `content` of a dummy secret or the
+`name` and `key` of a Taskcluster secret. Values are serialized to JSON when
+`json` is true. Every secret name is fetched only once, concurrently.
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import taskcluster
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def get_secrets_client():
+    try:
+        return taskcluster.Secrets(
+            {
+                # BaseUrl is still needed for tasks that haven't migrated to taskgraph yet.
+                "baseUrl": "http://taskcluster/secrets/v1",
+            }
+        )
+    except taskcluster.exceptions.TaskclusterFailure:
+        # taskcluster library >=5 errors out when `baseUrl` is used
+        return taskcluster.Secrets(
+            {
+                "rootUrl": os.environ.get(
+                    "TASKCLUSTER_PROXY_URL", "https://taskcluster.net"
+                ),
+            }
+        )
+
+
+def fetch_secrets(names, jobs=None):
+    """Return the secrets of the given names, fetched with a single client"""
+    names = sorted(set(names))
+    if not names:
+        return {}
+
+    client = get_secrets_client()
+    with ThreadPoolExecutor(max_workers=jobs or len(names)) as executor:
+        return dict(zip(names, executor.map(client.get, names)))
+
+
+def write_secrets(manifest, secrets):
+    for entry in manifest:
+        if "content" in entry:
+            value = entry["content"]
+        else:
+            value = secrets[entry["name"]]["secret"][entry["key"]]
+        if entry.get("json"):
+            value = json.dumps(value)
+
+        path = os.path.join(ROOT_DIR, entry["path"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        print("Outputting secret to: {}".format(path))
+        with open(path, "w") as f:
+            f.write(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the secrets of a task to files")
+    parser.add_argument("manifest", help="JSON list of the secrets to write")
+    parser.add_argument(
+        "-j", "--jobs", type=int, help="number of concurrent requests to taskcluster"
+    )
+    result = parser.parse_args()
+
+    manifest = json.loads(result.manifest)
+    secrets = fetch_secrets(
+        [entry["name"] for entry in manifest if "content" not in entry], result.jobs
+    )
+    write_secrets(manifest, secrets)
+
+
+if __name__ == "__main__":
+    main()